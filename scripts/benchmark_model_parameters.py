@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of model_parameters unit-converting accessors
+
+Times the construction of a parameter set, a single converted read such as
+Z.fl1h_lbft2 and a full RothermelAndrews2018 call, for model_parameters and
+for a copy of the previous implementation that built its conversion lambdas
+for every instance and split the attribute name on every read.
+
+Example Usage:
+    python -m scripts.benchmark_model_parameters --number 100000
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from wildfire_ROS_models.model_set import model_parameters, convert_SI
+from wildfire_ROS_models.RothermelAndrews2018 import (
+    RothermelAndrews2018,
+    RothermelAndrews2018_valuesset,
+)
+
+
+class legacy_model_parameters:
+    """
+    Accessors of model_parameters as they were before the shared conversion tables.
+    """
+
+    def __init__(self, params=None):
+        self.to_SI = {
+            unit: lambda x, factor=factor: np.multiply(x, factor)
+            for unit, factor in convert_SI.items()
+        }
+        self.from_SI = {
+            unit: lambda x, factor=factor: np.divide(x, factor)
+            for unit, factor in convert_SI.items()
+        }
+        self.to_SI["tan"] = lambda x: np.arctan(x)
+        self.from_SI["tan"] = lambda x: np.tan(x)
+        self.to_SI["deg"] = lambda x: np.radians(x)
+        self.from_SI["deg"] = lambda x: np.degrees(x)
+        self.SI_params = {}
+        if params is not None:
+            for key, value in params.items():
+                self.__setattr__(key, value)
+
+    def __getattr__(self, attr):
+        if "_" in attr:
+            param_name, unit = attr.split("_", 1)
+            if param_name in self.SI_params:
+                if unit in self.from_SI:
+                    return self.from_SI[unit](self.SI_params[param_name])
+                raise AttributeError(f"Conversion to '{unit}' not supported.")
+            raise AttributeError(f"Parameter '{param_name}' not found.")
+        if attr in self.SI_params:
+            return self.SI_params[attr]
+        raise AttributeError(f"Attribute '{attr}' not found.")
+
+    def __setattr__(self, attr, value):
+        if attr in ["SI_params", "to_SI", "from_SI"] or attr.startswith("_"):
+            object.__setattr__(self, attr, value)
+        else:
+            param_name, unit = attr.split("_", 1) if "_" in attr else (attr, None)
+            if unit:
+                self.SI_params[param_name] = self.to_SI[unit](value)
+            else:
+                self.SI_params[param_name] = value
+
+
+def benchmark(number):
+    values = {}
+    for group in RothermelAndrews2018_valuesset().values():
+        values.update(group)
+
+    print(f"{'':28s}{'legacy (us)':>14s}{'current (us)':>14s}{'speed-up':>10s}")
+    for label, statement in [
+        ("construction", "cls(values)"),
+        ("read Z.fl1h_lbft2", "Z.fl1h_lbft2"),
+        ("read Z.slope_deg", "Z.slope_deg"),
+        ("RothermelAndrews2018(Z)", "RothermelAndrews2018(Z)"),
+    ]:
+        timings = []
+        for cls in [legacy_model_parameters, model_parameters]:
+            scope = {
+                "cls": cls,
+                "values": values,
+                "Z": cls(values),
+                "RothermelAndrews2018": RothermelAndrews2018,
+            }
+            n = number if "Rothermel" not in label else max(number // 20, 1)
+            timings.append(
+                min(timeit.repeat(statement, globals=scope, number=n, repeat=5))
+                / n
+                * 1e6
+            )
+        print(
+            f"{label:28s}{timings[0]:14.3f}{timings[1]:14.3f}"
+            f"{timings[0] / timings[1]:9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time model_parameters accessors against the legacy implementation."
+    )
+    parser.add_argument(
+        "--number", type=int, default=100000, help="Number of timed calls per repeat"
+    )
+    args = parser.parse_args()
+    benchmark(args.number)
@@ -26,6 +26,7 @@ setup(
         "matplotlib>=3.5.0",
         "numpy>=1.21.0",
         "SALib>=1.5.3",
+        "scipy>=1.7.0",  # scipy.stats.qmc
         "scikit-learn>=1.0.2",
         "tensorflow>=2.0.0",  # Added TensorFlow
         # Add other dependencies here
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the wildfire_ROS_models parameter containers.
+
+Author: filippi_j
+"""
+
+import numpy as np
+import pytest
+from wildfire_ROS_models.model_set import model_parameters, ParameterBatch
+from wildfire_ROS_models.runROS import ROS_models
+
+
+def default_set(model_name):
+    values = {}
+    for group in ROS_models[model_name]["get_set"]().values():
+        values.update(group)
+    return values
+
+
+def test_parameter_batch():
+    """A batch holds SI columns and converts them like model_parameters."""
+    values = np.column_stack([np.linspace(0.1, 2, 5), np.linspace(0, 0.3, 5)])
+    batch = ParameterBatch(
+        ["fl1h_tac", "slope_tan"], values, base=default_set("RothermelAndrews2018")
+    )
+
+    assert batch.size == 5
+    assert batch.names == ["fl1h_tac", "slope_tan"]
+    np.testing.assert_allclose(batch.fl1h_tac, values[:, 0])
+    np.testing.assert_allclose(batch.fl1h_kgm2, values[:, 0] * 0.224)
+    np.testing.assert_allclose(batch.slope_rad, np.arctan(values[:, 1]))
+    assert batch.fd_ft == pytest.approx(1.8)
+    assert batch.get_matrix().shape == (2, 5)
+
+    result = ROS_models["RothermelAndrews2018"]["get_values_vectorized"](batch)
+    expected = [
+        ROS_models["RothermelAndrews2018"]["get_values"](batch.get_sample(i))
+        for i in range(batch.size)
+    ]
+    # rounded pound factors of convert_SI, see RA2018_RTOL in test_models
+    np.testing.assert_allclose(
+        result["ROS_ftmin"], [e["ROS_ftmin"] for e in expected], rtol=1e-5
+    )
+
+    batch.fl1h_kgm2 = 0.5
+    np.testing.assert_allclose(batch.get_matrix()[0], 0.5)
+
+    with pytest.raises(ValueError):
+        ParameterBatch(["fl1h_tac"], values)
+
+
+def test_shared_unit_conversions():
+    """Conversions come from shared tables and keep their error messages."""
+    params = model_parameters({"slope_deg": 45, "wind_miph": 10, "CODE": "A4"})
+
+    assert params.slope_tan == pytest.approx(1.0)
+    assert params.wind_mps == pytest.approx(4.4704)
+    assert params.CODE == "A4"
+    assert model_parameters.to_SI("deg", 180) == pytest.approx(np.pi)
+    assert model_parameters.from_SI("ft", 0.3048) == pytest.approx(1.0)
+    assert "to_SI" not in vars(params)
+
+    with pytest.raises(AttributeError, match="Conversion to 'furlong'"):
+        params.wind_furlong
+    with pytest.raises(AttributeError, match="Parameter 'fd' not found"):
+        params.fd_ft
+    with pytest.raises(AttributeError, match="Conversion from 'furlong'"):
+        params.fd_furlong = 1
+
+
+def test_serialization():
+    """Parameter sets survive pickling and the compact binary round trip."""
+    import pickle
+    from wildfire_ROS_models import fuels_database as fdb
+
+    fuel = fdb.load_csv(fdb.CB2005_t7_csv)[3]
+    fuel.wind = np.linspace(0, 5, 4)
+
+    for restored in [
+        pickle.loads(pickle.dumps(fuel)),
+        model_parameters.from_bytes(fuel.to_bytes()),
+    ]:
+        assert restored.keys() == fuel.keys()
+        assert restored.CODE == "GR4"
+        assert restored.fl1h_tac == pytest.approx(fuel.fl1h_tac)
+        np.testing.assert_array_equal(restored.wind, fuel.wind)
+
+    batch = ParameterBatch(["wind_miph"], np.arange(3.0), base=fuel)
+    restored = pickle.loads(pickle.dumps(batch))
+    np.testing.assert_allclose(restored.wind_miph, [0, 1, 2])
+    restored.wind_miph = 4
+    np.testing.assert_allclose(restored.get_matrix(), 4 * 0.44704)
+
+    with pytest.raises(ValueError):
+        model_parameters.from_bytes(b"not a parameter set")
+
+    flags = model_parameters({"flag": True, "mask": np.array([True, False])})
+    restored = model_parameters.from_bytes(flags.to_bytes())
+    assert restored.flag is True
+    assert restored.mask.dtype == bool
+    np.testing.assert_array_equal(restored.mask, [True, False])
+
+    with pytest.raises(TypeError, match=r"\['labels'\] cannot be serialized"):
+        model_parameters({"labels": np.array(["x"]), "wind": 1.0}).to_bytes()
+
+
+def test_layered_composition():
+    """Composition reads through the layers without copying or modifying them."""
+    import pickle
+
+    fuel = model_parameters({"fd": 0.5, "fl1h": 0.2, "wind": 1.0})
+    environment = model_parameters({"wind": 3.0, "slope_deg": 10})
+
+    with pytest.warns(UserWarning, match="'wind'") as record:
+        composed = fuel + environment
+    assert len(record) == 1
+    assert composed.wind == 1.0
+    assert composed.slope_deg == pytest.approx(10)
+    assert fuel.SI_params in composed.SI_params.maps
+
+    composed.wind = 5.0
+    assert fuel.wind == 1.0 and environment.wind == 3.0
+    fuel.fd = 0.6
+    assert composed.fd == 0.6
+
+    layered = model_parameters.compose(
+        composed, model_parameters({"fd": 1.0}), warn=False
+    )
+    assert layered.fd == 0.6 and layered.wind == 5.0
+    assert pickle.loads(pickle.dumps(layered)).SI_params == dict(layered.SI_params)
+    assert model_parameters.from_bytes(layered.to_bytes()).wind == 5.0
+
+    del layered["fd"]
+    assert "fd" not in layered.keys() and fuel.fd == 0.6
+    with pytest.raises(AttributeError):
+        layered.fd
+    with pytest.raises(KeyError):
+        del layered["fd"]
+    assert "fd" not in model_parameters.compose(layered, warn=False).keys()
+    layered.fd = 0.7
+    assert layered.fd == 0.7 and fuel.fd == 0.6
+
+
+def test_derived_parameters():
+    """Derived fuel quantities are cached and follow their dependencies."""
+    fuel = model_parameters({"fl1h": 0.4, "fd": 0.5, "fuelDens": 500.0})
+
+    assert fuel.bulkDens1h == pytest.approx(0.8)
+    assert fuel.packRatio1h == pytest.approx(0.8 / 500)
+    assert fuel.bulkDens1h_lbft3 == pytest.approx(0.8 / 16.0185)
+    assert "bulkDens1h" in fuel._derived and "bulkDens1h" not in fuel.keys()
+
+    fuel.fd_ft = 1
+    assert fuel.packRatio1h == pytest.approx(0.4 / 0.3048 / 500)
+    fuel.packRatio1h = 0.01
+    assert fuel.packRatio1h == 0.01
+
+    with pytest.raises(AttributeError, match="'SAVcar' not found"):
+        fuel.relPackRatio1h
+
+    batch = ParameterBatch(
+        ["fd"], [0.5, 1.0, 2.0], base=default_set("RothermelAndrews2018")
+    )
+    np.testing.assert_allclose(batch.bulkDens1h, batch.fl1h / np.array([0.5, 1, 2]))
+    batch.fd = 1.0
+    np.testing.assert_allclose(batch.bulkDens1h, batch.fl1h)
+    assert batch.get_sample(0).netLoad1h == pytest.approx(batch.fl1h * (1 - 0.0555))
+
+    environment = model_parameters({"wind": 1.0})
+    composed = model_parameters.compose(environment, fuel)
+    assert composed.bulkDens1h == pytest.approx(0.4 / 0.3048)
+    fuel.fl1h = 2.0
+    assert composed.bulkDens1h == pytest.approx(2.0 / 0.3048)
+
+    composed = model_parameters.compose(environment, batch, warn=False)
+    np.testing.assert_allclose(composed.bulkDens1h, batch.fl1h)
+    batch.fd = 2.0
+    np.testing.assert_allclose(composed.bulkDens1h, batch.fl1h / 2)
+    np.testing.assert_allclose(batch.bulkDens1h, batch.fl1h / 2)
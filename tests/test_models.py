@@ -8,18 +8,27 @@ Created on Mon Nov 20 08:01:29 2023
 Author: filippi_j
 """
 
+import json
 import pytest
 import matplotlib.pyplot as plt
 import numpy as np
 from wildfire_ROS_models import fuels_database as fdb
-from wildfire_ROS_models.runROS import run_model, plot_results
+from wildfire_ROS_models.runROS import run_model, plot_results, ROS_models
 from wildfire_ROS_models.model_set import model_parameters
 from wildfire_ROS_models.sensitivity import (
+    error_metrics,
+    default_parameters,
+    verify_error,
     plot_sobol_indices,
     generate_problem_set,
     sobol_analysis,
 )
 
+# RothermelAndrews2018_prepare converts the SI derived bulk densities to
+# lb/ft3 while the scalar model divides loads in lb/ft2 by depths in ft: the
+# rounded pound factors of convert_SI make the two differ by about 2e-6.
+RA2018_RTOL = 1e-5
+
 
 @pytest.fixture(scope="module")
 def setup_plotting():
@@ -179,3 +188,668 @@ def test_plot_sobol_indices(setup_plotting):
         plot_sobol_indices(Si_ros, params, y_pos, model_name)
     except Exception as e:
         pytest.fail(f"plot_sobol_indices raised an exception: {e}")
+
+
+def test_vectorized_AndrewsRothermel2018():
+    """The array path matches the scalar model element by element."""
+    from wildfire_ROS_models.RothermelAndrews2018 import (
+        RothermelAndrews2018,
+        RothermelAndrews2018_vectorized,
+    )
+
+    A2017 = fdb.load_csv(fdb.AR2017_table_csv)
+    A2017_any = fdb.load_csv(fdb.AR2017_anyfueltable_csv)
+    fm = A2017[1] + A2017_any[0] + model_parameters({"mdOnDry1h_r": 0.06})
+
+    rng = np.random.default_rng(0)
+    wind = rng.uniform(0, 20, 200)
+    slope = rng.uniform(-30, 40, 200)
+    moisture = rng.uniform(0, 0.3, 200)
+
+    expected = []
+    for w, s, m in zip(wind, slope, moisture):
+        fm.wind_miph, fm.slope_deg, fm.mdOnDry1h_r = w, s, m
+        expected.append(RothermelAndrews2018(fm))
+
+    fm.wind_miph, fm.slope_deg, fm.mdOnDry1h_r = wind, slope, moisture
+    result = RothermelAndrews2018_vectorized(fm)
+
+    for key in ["ROS_ftmin", "PR_r", "FI_BTUftmin"]:
+        assert result[key].shape == (200,)
+        np.testing.assert_allclose(
+            result[key], [e[key] for e in expected], rtol=RA2018_RTOL
+        )
+
+    fm.fl1h_tac = 0
+    assert not RothermelAndrews2018_vectorized(fm)["ROS_ftmin"].any()
+
+
+def test_broadcast_Rothermel1972():
+    """Rothermel1972 evaluates arrays of winds for one fuel in a single call."""
+    from wildfire_ROS_models.Rothermel1972 import (
+        Rothermel1972,
+        Rothermel1972_valuesset,
+    )
+
+    values = {}
+    for group in Rothermel1972_valuesset().values():
+        values.update(group)
+    fm = model_parameters(values)
+
+    winds = np.linspace(0, 10, 50)
+    slopes = np.array([0.0, 0.2])[:, None]
+    expected = []
+    for s in slopes[:, 0]:
+        for w in winds:
+            fm.wind, fm.slope = w, s
+            scalar = Rothermel1972(fm)
+            assert isinstance(scalar["ROS_ftmin"], float)
+            expected.append(scalar["ROS_ftmin"])
+
+    fm.wind, fm.slope = winds, slopes
+    result = Rothermel1972(fm)
+
+    for key in ["ROS_ftmin", "PR_r", "FI_BTUftmin"]:
+        assert result[key].shape == (2, 50)
+    np.testing.assert_allclose(result["ROS_ftmin"].ravel(), expected)
+
+
+def test_vectorized_Balbi2020():
+    """The batched solver reproduces the scalar fixed point of every scenario."""
+    from wildfire_ROS_models.Balbi2020 import Balbi2020, Balbi2020_vectorized
+
+    pn = fdb.load_csv(fdb.pineNeedlesBalbi2020_csv)[0] + model_parameters(
+        {"slope_deg": 0}
+    )
+    rng = np.random.default_rng(1)
+    wind = rng.uniform(0, 12, 100)
+    load = rng.uniform(0.05, 1.5, 100)
+
+    expected = []
+    for w, l in zip(wind, load):
+        pn.wind_mps, pn.fl1h_kgm2 = w, l
+        expected.append(Balbi2020(pn))
+
+    pn.wind_mps, pn.fl1h_kgm2 = wind, load
+    result = Balbi2020_vectorized(pn)
+
+    for key in ["ROS_mps", "FllH_m"]:
+        np.testing.assert_allclose(result[key], [e[key] for e in expected], rtol=1e-10)
+    assert result["iterations"].shape == (100,)
+    assert result["iterations"].min() >= 1
+    assert result["nonConverged"].dtype == bool
+
+    stalled = Balbi2020_vectorized(pn, N=1)
+    assert stalled["iterations"].max() == 2
+    assert stalled["nonConverged"].any()
+
+
+def test_Balbi2020_newton_solver():
+    """Newton reaches the fixed point tolerance in fewer map evaluations."""
+    from wildfire_ROS_models.Balbi2020 import Balbi2020, Balbi2020_vectorized
+
+    pn = fdb.load_csv(fdb.pineNeedlesBalbi2020_csv)[0] + model_parameters(
+        {"slope_deg": 0}
+    )
+    pn.wind_mps = np.linspace(0, 12, 25)
+    pn.fl1h_kgm2 = 0.9
+
+    fixed = Balbi2020_vectorized(pn)
+    newton = Balbi2020_vectorized(pn, solver="newton")
+
+    assert not newton["nonConverged"].any()
+    assert newton["iterations"].max() <= 10
+    assert newton["iterations"].sum() < fixed["iterations"].sum()
+    ok = ~fixed["nonConverged"]
+    np.testing.assert_allclose(
+        newton["ROS_mps"][ok], fixed["ROS_mps"][ok], rtol=0.05, atol=5e-3
+    )
+
+    pn.wind_mps = 8.0
+    np.testing.assert_allclose(
+        Balbi2020(pn, solver="newton")["ROS_mps"],
+        Balbi2020_vectorized(pn, solver="newton")["ROS_mps"],
+        rtol=1e-8,
+    )
+    with pytest.raises(ValueError):
+        Balbi2020(pn, solver="bisection")
+
+
+def test_Balbi2020_warm_start():
+    """Seeding each solve with its neighbour's solution needs few iterations."""
+    from wildfire_ROS_models.Balbi2020 import Balbi2020_vectorized
+
+    pn = fdb.load_csv(fdb.pineNeedlesBalbi2020_csv)[0] + model_parameters(
+        {"wind_mps": 0, "slope_deg": 0}
+    )
+    pn.fl1h_kgm2 = 0.9
+    winds = np.linspace(0, 12, 200)
+
+    cold = run_model("Balbi2020", pn, "wind_mps", winds)
+    warm = run_model("Balbi2020", pn, "wind_mps", winds, continuation=True)
+    np.testing.assert_allclose(
+        warm["results"].ROS_mps, cold["results"].ROS_mps, atol=5e-3
+    )
+    assert pn.wind_mps == 0
+
+    pn.wind_mps = winds
+    first = Balbi2020_vectorized(pn)
+    seeded = Balbi2020_vectorized(pn, R0=np.r_[0.1, first["ROS_mps"][:-1]])
+    assert seeded["iterations"][1:].max() <= 3
+    assert seeded["iterations"].sum() < first["iterations"].sum()
+
+
+@pytest.mark.parametrize(
+    "model_name", ["Rothermel1972", "RothermelAndrews2018", "Balbi2020"]
+)
+def test_prepare_evaluate_split(model_name):
+    """A prepared fuel record is reused across environments by broadcasting."""
+    from wildfire_ROS_models.runROS import ROS_models
+
+    values = {}
+    for group in ROS_models[model_name]["get_set"]().values():
+        values.update(group)
+    fuel = model_parameters(values)
+    loads = np.array([0.5, 1.0, 2.0])
+    fuel.fl1h = loads[:, None]
+    prepared = ROS_models[model_name]["prepare"](fuel)
+
+    environment = model_parameters(values)
+    environment.wind = np.array([0.0, 1.0, 3.0, 6.0])[None, :]
+    result = ROS_models[model_name]["evaluate"](prepared, environment)
+
+    for i, load in enumerate(loads):
+        single = model_parameters(values)
+        single.fl1h = load
+        single.wind = environment.wind[0]
+        expected = ROS_models[model_name]["get_values_vectorized"](single)
+        for key, value in result.items():
+            assert value.shape == (3, 4)
+            np.testing.assert_allclose(value[i], expected[key], rtol=1e-12)
+
+
+@pytest.mark.parametrize(
+    "model_name", ["Rothermel1972", "RothermelAndrews2018", "Balbi2020"]
+)
+def test_run_model_vectorized(model_name):
+    """A sweep is one vectorized call matching the point-by-point values."""
+    fm = model_parameters()
+    for group in ROS_models[model_name]["get_set"]().values():
+        fm = fm + model_parameters(group)
+    winds = np.linspace(0, 10, 7)
+
+    sweep = run_model(model_name, fm, "wind_mps", winds)
+    assert sweep["Model"] == model_name
+    assert not isinstance(fm.wind, np.ndarray)
+    np.testing.assert_allclose(sweep["results"].wind_mps, winds)
+    keys = ROS_models[model_name]["outputs"] + ["wind"]
+    assert list(sweep["results"].keys()) == keys
+    continued = run_model(model_name, fm, "wind_mps", winds[:2], continuation=True)
+    assert list(continued["results"].keys()) == keys
+    for i, wind in enumerate(winds):
+        fm.wind_mps = wind
+        expected = model_parameters(ROS_models[model_name]["get_values"](fm))
+        for key in expected.keys():
+            assert sweep["results"][key].shape == winds.shape
+            np.testing.assert_allclose(
+                sweep["results"][key][i], expected[key], rtol=RA2018_RTOL
+            )
+
+
+def test_run_grid():
+    """Grid sweeps return labelled N-D outputs independent of the chunking."""
+    from wildfire_ROS_models.runROS import run_grid
+
+    defaults = model_parameters()
+    for group in ROS_models["RothermelAndrews2018"]["get_set"]().values():
+        defaults = defaults + model_parameters(group)
+    fuels = [
+        model_parameters.compose(fuel, defaults, warn=False)
+        for fuel in fdb.load_csv(fdb.CB2005_t7_csv)[:3]
+    ]
+    grid = {
+        "wind_mps": np.linspace(0, 8, 5),
+        "slope_deg": [0, 10, 20],
+        "mdOnDry1h_r": [0.04, 0.08],
+    }
+
+    single = run_grid("RothermelAndrews2018", fuels[0], grid)
+    assert single["dims"] == ["wind_mps", "slope_deg", "mdOnDry1h_r"]
+    assert single["results"].ROS_mps.shape == (5, 3, 2)
+    environment = model_parameters({"slope_deg": 0, "mdOnDry1h_r": 0.04})
+    sweep = run_model(
+        "RothermelAndrews2018", environment + fuels[0], "wind_mps", grid["wind_mps"]
+    )
+    np.testing.assert_allclose(
+        single["results"].ROS_mps[:, 0, 0], sweep["results"].ROS_mps, rtol=1e-12
+    )
+
+    catalog = run_grid("RothermelAndrews2018", fuels, grid, chunk_size=7)
+    assert catalog["dims"][0] == "fuel"
+    assert catalog["coords"]["fuel"] == [fuel.CODE for fuel in fuels]
+    assert catalog["results"].ROS_mps.shape == (3, 5, 3, 2)
+    np.testing.assert_allclose(
+        catalog["results"].ROS_mps[0], single["results"].ROS_mps, rtol=1e-12
+    )
+    assert catalog["nonConverged"].shape == (3, 5, 3, 2)
+    assert not catalog["nonConverged"].any()
+
+    defaults = model_parameters()
+    for group in ROS_models["Balbi2020"]["get_set"]().values():
+        defaults = defaults + model_parameters(group)
+    balbi = run_grid("Balbi2020", defaults, {"wind_mps": grid["wind_mps"]})
+    assert list(balbi["results"].keys()) == ["ROS", "FllH"]
+    assert balbi["nonConverged"].dtype == bool
+    assert balbi["nonConverged"].shape == (5,)
+
+
+@pytest.mark.parametrize(
+    "model_name", ["Rothermel1972", "RothermelAndrews2018", "Balbi2020"]
+)
+def test_run_fuel_catalog(model_name):
+    """Fuels and environments broadcast to a (n_fuels, n_envs) table."""
+    from wildfire_ROS_models.runROS import run_fuel_catalog
+
+    defaults = model_parameters()
+    for group in ROS_models[model_name]["get_set"]().values():
+        defaults = defaults + model_parameters(group)
+    fuels = [
+        model_parameters.compose(fuel, defaults, warn=False)
+        for fuel in fdb.load_csv(fdb.CB2005_t7_csv)[:4]
+    ]
+    environments = {
+        "wind_mps": np.linspace(0, 6, 9),
+        "slope_deg": np.linspace(0, 20, 9),
+        "mdOnDry1h_r": np.linspace(0.03, 0.12, 9),
+    }
+
+    catalog = run_fuel_catalog(model_name, fuels, environments, chunk_size=4)
+    assert catalog["FUELCODE"] == [fuel.CODE for fuel in fuels]
+    assert list(catalog["results"].keys()) == ROS_models[model_name]["outputs"]
+    assert catalog["nonConverged"].dtype == bool
+    assert catalog["nonConverged"].shape == (4, 9)
+    for f, fuel in enumerate(fuels):
+        expected = pointwise_outputs(model_name, fuel, environments)
+        for key in ROS_models[model_name]["outputs"]:
+            value = expected[key]
+            assert catalog["results"][key].shape == (4, 9)
+            np.testing.assert_allclose(
+                catalog["results"][key][f], value, rtol=RA2018_RTOL
+            )
+
+    environments["Dme_r"] = np.linspace(0.1, 0.4, 9)
+    catalog = run_fuel_catalog(model_name, fuels, environments, chunk_size=4)
+    for f, fuel in enumerate(fuels):
+        expected = pointwise_outputs(model_name, fuel, environments)
+        np.testing.assert_allclose(
+            catalog["results"]["ROS"][f], expected["ROS"], rtol=RA2018_RTOL
+        )
+
+
+def pointwise_outputs(model_name, fuel, environments):
+    """Point by point outputs of the model for each environment state."""
+    outputs = {}
+    for i in range(len(environments["wind_mps"])):
+        scenario = model_parameters.compose(
+            model_parameters({key: value[i] for key, value in environments.items()}),
+            fuel,
+            warn=False,
+        )
+        result = model_parameters(ROS_models[model_name]["get_values"](scenario))
+        for key, value in result.items():
+            outputs.setdefault(key, []).append(value)
+    return outputs
+
+
+def test_parallel_problem_set():
+    """Executors and chunking do not change the generated samples."""
+    kwargs = dict(
+        kind_of_parameter=["environment", "fuelstate"],
+        result_var="ROS",
+        N=64,
+        seed=1,
+    )
+    problem = generate_problem_set(
+        "Balbi2020", executor="process", chunk_size=100, **kwargs
+    )
+
+    assert problem["results"].shape == (64 * (2 * problem["num_vars"] + 2),)
+    assert verify_error(problem) == 0
+    assert verify_error(problem, executor="thread", chunk_size=50) == 0
+
+    sweep = run_model(
+        "Balbi2020",
+        default_parameters("Balbi2020"),
+        "wind_mps",
+        np.linspace(0, 10, 25),
+        executor="process",
+        chunk_size=4,
+    )
+    assert sweep["results"].ROS_mps.shape == (25,)
+
+
+def test_vectorized_problem_set(monkeypatch):
+    """Sample batches match the point by point evaluation of the model."""
+    problem = generate_problem_set(
+        "RothermelAndrews2018",
+        kind_of_parameter=["typical", "environment", "fuelstate"],
+        N=64,
+    )
+    model = ROS_models["RothermelAndrews2018"]
+    monkeypatch.delitem(model, "get_values_vectorized")
+    assert verify_error(problem, chunk_size=100) < RA2018_RTOL
+
+
+def test_error_metrics():
+    """Error statistics for plain and train/val problem sets in one pass."""
+    kwargs = dict(kind_of_parameter=["environment", "fuelstate"], N=32)
+    problem = generate_problem_set("RothermelAndrews2018", **kwargs)
+    n = len(problem["results"])
+    problem["shifted"] = problem["results"] + np.linspace(0, 0.2, n)
+
+    metrics = error_metrics(problem, lookat="shifted", quantiles=(0.5, 1.0))
+    assert metrics["n"] == n
+    assert metrics["MAE"] == pytest.approx(0.1)
+    assert metrics["max"] == pytest.approx(0.2)
+    assert metrics["RMSE"] == pytest.approx(
+        np.sqrt(np.mean(np.linspace(0, 0.2, n) ** 2))
+    )
+    assert metrics["relative_quantiles"][1.0] > 0
+    assert verify_error(problem, lookat="shifted") == pytest.approx(0.1)
+
+    split = generate_problem_set("RothermelAndrews2018", val_prop=0.25, **kwargs)
+    metrics = error_metrics(split, executor="thread", chunk_size=50)
+    assert metrics["train"]["n"] + metrics["val"]["n"] == n
+    assert metrics["val"]["max"] < 1e-12
+    assert verify_error(split)["train"] < 1e-12
+
+
+def test_streamed_problem_set(tmp_path):
+    """Streamed blocks reproduce the direct Sobol sampling in bounded memory."""
+    from SALib.sample import sobol as sobolsample
+    from wildfire_ROS_models.sensitivity import sobol_blocks
+
+    kwargs = dict(kind_of_parameter=["environment", "fuelstate"], N=16, seed=3)
+    direct = generate_problem_set("RothermelAndrews2018", **kwargs)
+    streamed = generate_problem_set(
+        "RothermelAndrews2018", block_size=4, directory=tmp_path, **kwargs
+    )
+
+    np.testing.assert_array_equal(streamed["input"], direct["input"])
+    np.testing.assert_allclose(streamed["results"], direct["results"], rtol=1e-12)
+    np.testing.assert_array_equal(
+        np.load(tmp_path / "outputs.npy"), streamed["outputs"]
+    )
+
+    blocks = list(sobol_blocks(direct, 16, 8, calc_second_order=False, seed=5))
+    assert [start for start, _ in blocks] == [0, 8 * (direct["num_vars"] + 2)]
+    np.testing.assert_array_equal(
+        np.concatenate([rows for _, rows in blocks]),
+        sobolsample.sample(direct, 16, calc_second_order=False, seed=5),
+    )
+
+
+def test_resumed_problem_set(tmp_path, monkeypatch):
+    """An interrupted generation resumes from its last completed block."""
+    from wildfire_ROS_models import sensitivity
+
+    kwargs = dict(
+        kind_of_parameter=["environment", "fuelstate"],
+        N=32,
+        block_size=8,
+        directory=tmp_path,
+    )
+    evaluate = sensitivity.evaluate_samples
+    calls = []
+
+    def interrupted(*args, **kw):
+        calls.append(len(args[3]))
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return evaluate(*args, **kw)
+
+    monkeypatch.setattr(sensitivity, "evaluate_samples", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        generate_problem_set("RothermelAndrews2018", **kwargs)
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert manifest["completed"] == [0, 1]
+
+    calls.clear()
+    resumed = generate_problem_set("RothermelAndrews2018", **kwargs)
+    assert len(calls) == 2
+    monkeypatch.setattr(sensitivity, "evaluate_samples", evaluate)
+    fresh = generate_problem_set(
+        "RothermelAndrews2018", seed=manifest["seed"], **{**kwargs, "directory": None}
+    )
+    np.testing.assert_array_equal(resumed["input"], fresh["input"])
+    np.testing.assert_allclose(resumed["results"], fresh["results"], rtol=1e-12)
+    assert json.loads((tmp_path / "manifest.json").read_text())["completed"] == [
+        0,
+        1,
+        2,
+        3,
+    ]
+
+    with pytest.raises(ValueError, match="another problem"):
+        generate_problem_set("RothermelAndrews2018", **{**kwargs, "N": 64})
+
+
+def test_adaptive_sobol_analysis():
+    """N doubles over one Sobol sequence until the intervals are narrow enough."""
+    from SALib.sample import sobol as sobolsample
+    from wildfire_ROS_models.sensitivity import adaptive_sobol_analysis
+
+    kwargs = dict(kind_of_parameter=["environment"], seed=2, N_start=16)
+    Si, problem = adaptive_sobol_analysis(
+        "RothermelAndrews2018", tolerance=0, N_max=64, **kwargs
+    )
+    assert problem["N"] == 64 and not problem["converged"]
+    assert problem["evaluations"] == 64 * (2 * problem["num_vars"] + 2)
+    assert problem["kept"] == Si["kept"] == 64
+    np.testing.assert_array_equal(
+        problem["input"], sobolsample.sample(problem, 64, seed=2)
+    )
+    assert len(Si["S1"]) == problem["num_vars"]
+
+    Si, problem = adaptive_sobol_analysis(
+        "RothermelAndrews2018", tolerance=10, **kwargs
+    )
+    assert problem["N"] == 16 and problem["converged"]
+
+
+def test_morris_screening():
+    """The screening ranks parameters and feeds the Sobol stage."""
+    from wildfire_ROS_models.sensitivity import (
+        influential_parameters,
+        morris_screening,
+    )
+
+    Si, problem = morris_screening("Balbi2020", num_trajectories=20, seed=3)
+    assert len(problem["results"]) == 20 * (problem["num_vars"] + 1)
+    assert 0 < problem["kept"] <= 20
+    assert "Ti" not in problem["names"] and "wind" in problem["names"]
+
+    selected = influential_parameters(Si, threshold=0.2)
+    mu_star = dict(zip(Si["names"], Si["mu_star"]))
+    assert selected == sorted(selected, key=lambda name: -mu_star[name])
+    assert all(mu_star[name] >= 0.2 * max(mu_star.values()) for name in selected)
+    ranking = influential_parameters(Si, threshold=0)
+    assert len(ranking) == problem["num_vars"] and ranking[: len(selected)] == selected
+    assert influential_parameters(Si, threshold=0, max_params=3) == ranking[:3]
+
+    problem_set = generate_problem_set(
+        "Balbi2020", N=8, selected_params=selected, seed=3
+    )
+    assert problem_set["names"] == selected
+
+
+def test_multi_output_problem_set():
+    """Every output is kept, and analyzed from the same samples."""
+    problem_set = generate_problem_set(
+        "RothermelAndrews2018",
+        kind_of_parameter=["environment", "fuelstate"],
+        result_var="FI_BTUftmin",
+        N=64,
+        seed=4,
+    )
+    assert problem_set["output_names"] == ["ROS", "PR", "FI"]
+    assert problem_set["outputs"].shape == (len(problem_set["input"]), 3)
+    outputs = model_parameters(
+        {"FI": problem_set["outputs"][:, 2], "PR": problem_set["outputs"][:, 1]}
+    )
+    np.testing.assert_array_equal(problem_set["results"], outputs["FI_BTUftmin"])
+    assert verify_error(problem_set) == 0
+
+    Si, _, _, _ = sobol_analysis(problem_set, outputs="all")
+    assert list(Si) == ["ROS", "PR", "FI"]
+    Si_FI, _, _, _ = sobol_analysis(problem_set)
+    np.testing.assert_allclose(Si["FI"]["ST"], Si_FI["ST"])
+    Si_PR, _, _, _ = sobol_analysis(problem_set, outputs=["PR_r"])
+    np.testing.assert_allclose(Si_PR["PR_r"]["S1"], Si["PR"]["S1"])
+
+
+def test_parallel_bootstrap():
+    """Blocked bootstrap intervals do not depend on the executor."""
+    problem_set = generate_problem_set(
+        "RothermelAndrews2018",
+        kind_of_parameter=["environment", "fuelstate"],
+        N=256,
+        seed=5,
+    )
+    reference, _, _, _ = sobol_analysis(problem_set, seed=6)
+    serial, _, _, _ = sobol_analysis(problem_set, seed=6, executor="serial")
+    process, _, _, _ = sobol_analysis(
+        problem_set, outputs=["ROS"], seed=6, executor="process"
+    )
+    for key in ["S1", "S1_conf", "ST", "ST_conf", "S2", "S2_conf"]:
+        np.testing.assert_array_equal(process["ROS"][key], serial[key])
+        np.testing.assert_allclose(serial[key], reference[key], rtol=1e-10)
+
+
+def test_catalog_sobol_analysis():
+    """Per-fuel indices from one shared sample matrix."""
+    from SALib.analyze import sobol
+    from SALib.sample import sobol as sobolsample
+    from wildfire_ROS_models.runROS import evaluate_samples
+    from wildfire_ROS_models.sensitivity import (
+        catalog_fuels,
+        catalog_sobol_analysis,
+    )
+
+    fuels = catalog_fuels("Rothermel1972")[::15]
+    catalog = catalog_sobol_analysis("Rothermel1972", fuels, N=32, seed=7)
+    assert catalog["FUELCODE"] == [fuel.CODE for fuel in fuels]
+    assert catalog["names"] == ["wind", "slope", "mdOnDry1h"]
+    assert catalog["ST"].shape == (3, 3)
+
+    problem = {
+        "num_vars": 3,
+        "names": catalog["names"],
+        "bounds": catalog["bounds"],
+    }
+    samples = sobolsample.sample(problem, 32, seed=7)
+    for f, fuel in enumerate(fuels):
+        outputs = evaluate_samples("Rothermel1972", fuel, catalog["names"], samples)
+        Si = sobol.analyze(problem, np.asarray(outputs["ROS"]), seed=7)
+        for key in ["S1", "S1_conf", "ST", "ST_conf"]:
+            np.testing.assert_allclose(catalog[key][f], Si[key], atol=1e-12)
+
+
+def test_problem_set_diagnostics(monkeypatch):
+    """Solver diagnostics mask samples instead of being analyzed."""
+    from functools import partial
+    from SALib.analyze import sobol
+    from wildfire_ROS_models.Balbi2020 import Balbi2020_vectorized
+    from wildfire_ROS_models.sensitivity import finite_points
+
+    model = ROS_models["Balbi2020"]
+    monkeypatch.setitem(
+        model, "get_values_vectorized", partial(Balbi2020_vectorized, N=8)
+    )
+    problem_set = generate_problem_set(
+        "Balbi2020", kind_of_parameter=["environment"], N=64, seed=3
+    )
+    assert problem_set["output_names"] == ["ROS", "FllH"]
+    failed = np.isnan(problem_set["results"])
+    assert failed.any() and not failed.all()
+
+    points = problem_set["results"].reshape(64, -1)
+    kept = np.isfinite(points).all(axis=1)
+    dropped = f"Only {kept.sum()} of 64 base samples have finite results"
+    with pytest.warns(RuntimeWarning, match=dropped):
+        Y = finite_points(problem_set, problem_set["results"])
+    np.testing.assert_array_equal(Y, points[kept].ravel())
+    with pytest.warns(RuntimeWarning, match=dropped):
+        Si, _, _, _ = sobol_analysis(problem_set, outputs="all", seed=3)
+    assert list(Si) == ["ROS", "FllH"]
+    assert Si["ROS"]["kept"] == kept.sum()
+    np.testing.assert_allclose(Si["ROS"]["ST"], sobol.analyze(problem_set, Y)["ST"])
+    with pytest.warns(RuntimeWarning, match=dropped):
+        Si, _, _, _ = sobol_analysis(problem_set, seed=3, executor="serial")
+    assert Si["kept"] == kept.sum()
+
+
+def test_catalog_sobol_fuel_static():
+    """Sampled fuel-static parameters are honoured by the catalog analysis."""
+    from SALib.analyze import sobol
+    from SALib.sample import sobol as sobolsample
+    from wildfire_ROS_models.runROS import evaluate_samples
+    from wildfire_ROS_models.sensitivity import (
+        catalog_fuels,
+        catalog_sobol_analysis,
+    )
+
+    fuels = catalog_fuels("RothermelAndrews2018")[::20]
+    catalog = catalog_sobol_analysis(
+        "RothermelAndrews2018",
+        fuels,
+        kind_of_parameter=["typical", "environment"],
+        N=64,
+        seed=1,
+    )
+    assert "H_BTUlb" in catalog["names"]
+    assert (catalog["ST"][:, catalog["names"].index("H_BTUlb")] > 0).all()
+
+    problem = {
+        "num_vars": len(catalog["names"]),
+        "names": catalog["names"],
+        "bounds": catalog["bounds"],
+    }
+    samples = sobolsample.sample(problem, 64, seed=1)
+    for f, fuel in enumerate(fuels):
+        outputs = evaluate_samples(
+            "RothermelAndrews2018", fuel, catalog["names"], samples
+        )
+        Si = sobol.analyze(problem, np.asarray(outputs["ROS"]), seed=1)
+        np.testing.assert_allclose(catalog["ST"][f], Si["ST"], rtol=1e-8)
+
+
+def test_catalog_sobol_non_converged():
+    """Non converged catalog points are left out as in evaluate_samples."""
+    from SALib.analyze import sobol
+    from SALib.sample import sobol as sobolsample
+    from wildfire_ROS_models.runROS import evaluate_samples
+    from wildfire_ROS_models.sensitivity import (
+        catalog_fuels,
+        catalog_sobol_analysis,
+        finite_points,
+    )
+
+    fuels = catalog_fuels("Balbi2020")[::8]
+    with pytest.warns(RuntimeWarning, match="base samples of the fuels"):
+        catalog = catalog_sobol_analysis("Balbi2020", fuels, N=32, seed=1)
+    assert (catalog["kept"] < 32).any()
+
+    problem = {
+        "num_vars": len(catalog["names"]),
+        "names": catalog["names"],
+        "bounds": catalog["bounds"],
+    }
+    samples = sobolsample.sample(problem, 32, seed=1)
+    for f, fuel in enumerate(fuels):
+        outputs = evaluate_samples("Balbi2020", fuel, catalog["names"], samples)
+        Y = finite_points(problem, outputs["ROS"], warn=False)
+        assert catalog["kept"][f] == len(Y) // (2 * problem["num_vars"] + 2)
+        if catalog["kept"][f] >= 2:
+            Si = sobol.analyze(problem, Y, seed=1)
+            np.testing.assert_allclose(catalog["ST"][f], Si["ST"], rtol=1e-8)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the wildfire_ROS_models parallel evaluation helpers.
+
+Author: filippi_j
+"""
+
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+from wildfire_ROS_models.parallel import SharedArray, map_chunks
+
+
+def row_sums(scale, rows):
+    return scale * rows.sum(axis=1, keepdims=True)
+
+
+def failing(rows):
+    raise RuntimeError("model failure")
+
+
+@pytest.mark.parametrize("executor", ["serial", "thread", "process"])
+def test_map_chunks_in_place(executor):
+    """Chunks are written in place, in row order, whatever the executor."""
+    matrix = np.arange(30.0).reshape(10, 3)
+    expected = 2 * matrix.sum(axis=1, keepdims=True)
+
+    out = np.zeros((10, 1))
+    assert map_chunks(row_sums, matrix, (2,), executor, 3, out=out) is out
+    np.testing.assert_array_equal(out, expected)
+
+    chunks = map_chunks(row_sums, matrix, (2,), executor, 4)
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    np.testing.assert_array_equal(np.concatenate(chunks), expected)
+
+    with SharedArray.create((10, 1)) as shared:
+        map_chunks(row_sums, matrix, (2,), executor, 3, out=shared)
+        np.testing.assert_array_equal(shared.array, expected)
+
+
+def test_shared_array_cleanup():
+    """Shared blocks are released when the evaluation fails."""
+    with pytest.raises(RuntimeError, match="model failure"):
+        with SharedArray.from_array(np.ones((4, 2))) as shared:
+            name = shared.name
+            map_chunks(failing, shared.array, executor="process", chunk_size=2)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    with pytest.raises(ValueError, match="closed"):
+        shared.array
+
+
+def test_serial_submit():
+    """The serial executor runs submitted calls at once."""
+    from concurrent.futures import wait
+    from wildfire_ROS_models.parallel import get_executor
+
+    with get_executor("serial") as pool:
+        future = pool.submit(row_sums, 2, rows=np.ones((2, 3)))
+        failed = pool.submit(failing, None)
+    assert future.done() and not wait([future, failed]).not_done
+    np.testing.assert_array_equal(future.result(), [[6.0], [6.0]])
+    with pytest.raises(RuntimeError, match="model failure"):
+        failed.result()
@@ -49,7 +49,19 @@ def Balbi2020_valuesset():
     }
 
 
-def Balbi2020(Z, print_calculus=False):
+def Balbi2020(Z, print_calculus=False, solver="fixed_point", R0=0.1):
+    """
+    Balbi 2020 rate of spread, solved for each scenario by iterating
+    R -> Rb + Rc + Rr until two iterates differ by less than maxEps.
+
+    solver selects the iteration: "fixed_point" (plain substitution) or
+    "newton" (safeguarded Newton with a finite difference derivative of the
+    map, falling back on a substitution step when the Newton step is not
+    usable). Both stop on the same tolerance.
+
+    R0 is the initial guess of the iteration (m/s), seeding it with the
+    solution of a neighbouring scenario cuts the number of iterations.
+    """
 
     # Fuel Characteristic Parameters
     lDeltaH = Z.H_Jkg
@@ -93,7 +105,7 @@ def Balbi2020(Z, print_calculus=False):
     if RU > 0:
         lU = RU
 
-    R = 0.1  # first guess in iteration
+    R = R0  # first guess in iteration
     Rnew = 0
     maxEps = 0.001
     N = 100
@@ -116,7 +128,7 @@ def Balbi2020(Z, print_calculus=False):
     # coefficient p required for T derived from expression between C7 and C8
     p = (2 / lr00) / ltau0
 
-    while stopcondition:
+    def rate(R):
 
         # Radiant fractor eq. C7
         Chi = lChi0 / (1 + p * ((R * ltau0 * math.cos(lalpha)) / (2 * ls)))
@@ -147,17 +159,46 @@ def Balbi2020(Z, print_calculus=False):
             )
         )  # eq. 15
 
-        Rnew = Rb + Rc + Rr
+        return Rb + Rc + Rr, H
 
+    if solver == "newton":
+        # safeguarded Newton on R - rate(R) = 0, the returned value is the
+        # substitution rate(R) so that the stopping test is the same as below
+        Rnew, H = rate(R)
         error = R - Rnew
-
-        R = Rnew
-        if step > N:
-            flag = 0
-            break
-        step = step + 1
-
-        stopcondition = abs(error) > maxEps
+        while abs(error) > maxEps:
+            if step > N:
+                flag = 0
+                break
+            step = step + 1
+            dR = 1e-7 * max(abs(R), 1e-3)
+            slope = (rate(R + dR)[0] - Rnew) / dR - 1.0
+            try:
+                Rn = R + error / slope
+            except ZeroDivisionError:
+                Rn = Rnew
+            # fall back on the plain substitution when Newton goes astray
+            if not (math.isfinite(Rn) and Rn > 0):
+                Rn = Rnew
+            R = Rn
+            Rnew, H = rate(R)
+            error = R - Rnew
+    elif solver == "fixed_point":
+        while stopcondition:
+
+            Rnew, H = rate(R)
+
+            error = R - Rnew
+
+            R = Rnew
+            if step > N:
+                flag = 0
+                break
+            step = step + 1
+
+            stopcondition = abs(error) > maxEps
+    else:
+        raise ValueError(f"Unknown solver '{solver}' for Balbi2020.")
 
     if flag != 1:
         if print_calculus:
@@ -171,6 +212,241 @@ def Balbi2020(Z, print_calculus=False):
     return {"ROS_mps": Rnew, "FllH_m": H}
 
 
+def _Balbi2020_rate(R, c):
+    """
+    One substitution of the Balbi2020 fixed point, R -> Rb + Rc + Rr.
+
+    c holds the loop invariant terms as arrays aligned with R, returns the new
+    rate of spread and the flame height.
+    """
+    # Radiant fractor eq. C7
+    Chi = c["X0"] / (1 + c["p"] * ((R * c["tau0"] * c["cos_alpha"]) / (2 * c["ls"])))
+    # Mean Flame Temperature eq. B11
+    T = c["Ta"] + c["DeltaH"] * ((1 - Chi) / (c["Cpa"] * (c["st"] + 1)))
+    # reference vertical velocity eq. B9
+    u0 = c["u0_T"] * T
+    # flame angle
+    gamma = np.arctan(c["tan_alpha"] + (c["U"] / u0))
+    # Flame Height
+    H = (u0**2) / (c["g"] * (T / c["Ta"] - 1.0))
+
+    Rb = c["Rb_T4"] * T**4
+    Rc2 = (c["h"] / (2 * c["h"] + H)) * c["tan_alpha"] + (
+        (c["U"] * np.exp(-c["K1_sqrtBeta"] * R)) / u0
+    )
+    Rc = c["Rc1"] * Rc2  # eq. 27
+    Rr = (
+        c["A"]
+        * R
+        * (
+            (1 + np.sin(gamma) - np.cos(gamma))
+            / (1 + ((R * np.cos(gamma)) / c["ls_r00"]))
+        )
+    )  # eq. 15
+
+    return Rb + Rc + Rr, H
+
+
+def Balbi2020_prepare(fuel):
+    """
+    Fuel-static part of Balbi2020.
+
+    Computes the terms that only depend on fuel properties and model constants
+    (packing ratio Beta, leaf area S, scaling factor ar, p, and Rc1, Rb and A
+    up to the ignition energy q that depends on moisture and air temperature),
+    to be reused by Balbi2020_evaluate for any number of environments.
+    """
+    lDeltaH = np.asarray(fuel.H_Jkg, dtype=float)
+    lh = np.asarray(fuel.fd_m, dtype=float)
+    lrhov = np.asarray(fuel.fuelDens_kgm3, dtype=float)
+    st = np.asarray(fuel.st_r, dtype=float)
+    ltau0 = np.asarray(fuel.Tau0_spm, dtype=float)
+    ls = np.asarray(fuel.SAV1h_minv, dtype=float)
+    lr00 = np.asarray(fuel.r00, dtype=float)
+    lChi0 = np.asarray(fuel.X0, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Packing ratio, see derived_properties
+        Beta = np.asarray(fuel.packRatio1h, dtype=float)
+        # Leaf Area ratio just before eq. 13
+        S = ls * Beta * lh
+        # scaling factor eq. 17
+        ar = np.minimum(S / (2 * np.pi), 1.0)
+        Rb_coef = np.minimum((S / np.pi), 1.0) * (np.asarray(fuel.B) / (Beta * lrhov))
+        Rc1_coef = ls * (lDeltaH / ltau0) * np.minimum(lh, (2 * np.pi) / (ls * Beta))
+        return {
+            "h": lh,
+            "ls": ls,
+            "tau0": ltau0,
+            "st": st,
+            "DeltaH": lDeltaH,
+            "X0": lChi0,
+            "Cpa": np.asarray(fuel.Cpa_JkgK, dtype=float),
+            "g": np.asarray(fuel.g, dtype=float),
+            # ignition energy eq. 9 terms
+            "Cp": np.asarray(fuel.Cpf_JkgK, dtype=float),
+            "Ti": np.asarray(fuel.Ti_degK, dtype=float),
+            "Tvap": np.asarray(fuel.Tvap_degK, dtype=float),
+            "hEvap": np.asarray(fuel.hEvap_Jkg, dtype=float),
+            # coefficient p required for T derived from expression between C7 and C8
+            "p": (2 / lr00) / ltau0,
+            # u0 = u0_coef * T / (Ta * rhoa), eq. B9
+            "u0_coef": 2 * (st + 1) / ltau0 * lrhov * np.minimum(S, 2 * np.pi),
+            # Rb = Rb_coef * T**4 / q
+            "Rb_coef": Rb_coef,
+            # Rc1 = Rc1_coef / q, eq. 27
+            "Rc1_coef": Rc1_coef,
+            # A = A_coef / q, eq. 16
+            "A_coef": ar * ((lChi0 * lDeltaH) / 4),
+            "K1_sqrtBeta": np.asarray(fuel.K1_spm, dtype=float) * np.sqrt(Beta),
+            "ls_r00": ls * lr00,
+        }
+
+
+def Balbi2020_evaluate(
+    prepared, environment, maxEps=0.001, N=100, solver="fixed_point", R0=0.1
+):
+    """
+    Environment-dependent part of Balbi2020, solving the fixed point.
+
+    prepared is the record returned by Balbi2020_prepare, environment provides
+    air temperature and density, slope, wind and 1h fuel moisture. Arrays of
+    both are broadcast against each other and all scenarios are iterated
+    together, solver being "fixed_point" or "newton" as in Balbi2020. Elements
+    are frozen as soon as they converge and the loop stops once every element
+    has converged or N steps are exceeded. R0 is the initial guess, a scalar or
+    an array broadcastable to the scenarios.
+
+    Returns ROS_mps and FllH_m arrays, the per-element number of map
+    evaluations ("iterations", counting the finite difference evaluation of
+    each Newton step after the first) and a boolean "nonConverged" flag array.
+    """
+    lTa = np.asarray(environment.Ta_degK, dtype=float)
+    lalpha = np.asarray(environment.slope_rad, dtype=float)
+    RU = np.asarray(environment.wind_mps, dtype=float)
+    lrhoa = np.asarray(environment.airDens_kgm3, dtype=float)
+    lm = np.asarray(environment.mdOnDry1h_r, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Ignition energy (J/kg) # eq. 9
+        q = prepared["Cp"] * (prepared["Ti"] - lTa) + lm * (
+            prepared["hEvap"] + prepared["Cp"] * (prepared["Tvap"] - lTa)
+        )
+        c = {
+            "X0": prepared["X0"],
+            "p": prepared["p"],
+            "tau0": prepared["tau0"],
+            "cos_alpha": np.cos(lalpha),
+            "tan_alpha": np.tan(lalpha),
+            "ls": prepared["ls"],
+            "Ta": lTa,
+            "DeltaH": prepared["DeltaH"],
+            "Cpa": prepared["Cpa"],
+            "st": prepared["st"],
+            "u0_T": prepared["u0_coef"] / (lTa * lrhoa),
+            "U": np.maximum(RU, 0),
+            "g": prepared["g"],
+            "Rb_T4": prepared["Rb_coef"] / q,
+            "h": prepared["h"],
+            "K1_sqrtBeta": prepared["K1_sqrtBeta"],
+            "Rc1": prepared["Rc1_coef"] / q,
+            "A": prepared["A_coef"] / q,
+            "ls_r00": prepared["ls_r00"],
+        }
+        shape = np.broadcast_shapes(*[np.shape(value) for value in c.values()])
+        c = {key: np.broadcast_to(value, shape).ravel() for key, value in c.items()}
+
+        size = int(np.prod(shape))
+        ROS = np.zeros(size)
+        FllH = np.zeros(size)
+        iterations = np.zeros(size, dtype=int)
+        nonConverged = np.zeros(size, dtype=bool)
+
+        # no fuel depth, no spread
+        idx = np.flatnonzero(c["h"] > 0)
+        c = {key: value[idx] for key, value in c.items()}
+
+        # first guess in iteration
+        R = np.broadcast_to(np.asarray(R0, dtype=float), shape).ravel()[idx]
+        step = 1
+        if solver == "newton":
+            Rnew, H = _Balbi2020_rate(R, c)
+            while idx.size > 0:
+                error = R - Rnew
+
+                ROS[idx] = Rnew
+                FllH[idx] = H
+                # every step after the first one also evaluates the derivative
+                iterations[idx] = 2 * step - 1
+
+                # freeze the converged elements, keep iterating the others
+                active = np.abs(error) > maxEps
+                if not active.all():
+                    idx, R, Rnew, error = (
+                        idx[active],
+                        R[active],
+                        Rnew[active],
+                        error[active],
+                    )
+                    c = {key: value[active] for key, value in c.items()}
+                    if idx.size == 0:
+                        break
+
+                if step > N:
+                    nonConverged[idx] = True
+                    break
+                step = step + 1
+
+                dR = 1e-7 * np.maximum(np.abs(R), 1e-3)
+                slope = (_Balbi2020_rate(R + dR, c)[0] - Rnew) / dR - 1.0
+                Rn = R + error / slope
+                # fall back on the plain substitution when Newton goes astray
+                R = np.where(np.isfinite(Rn) & (Rn > 0), Rn, Rnew)
+                Rnew, H = _Balbi2020_rate(R, c)
+        elif solver == "fixed_point":
+            while idx.size > 0:
+                Rnew, H = _Balbi2020_rate(R, c)
+                error = R - Rnew
+                R = Rnew
+
+                ROS[idx] = Rnew
+                FllH[idx] = H
+                iterations[idx] = step
+
+                if step > N:
+                    nonConverged[idx] = True
+                    break
+                step = step + 1
+
+                # freeze the converged elements, keep iterating the others
+                active = np.abs(error) > maxEps
+                if not active.all():
+                    idx = idx[active]
+                    R = R[active]
+                    c = {key: value[active] for key, value in c.items()}
+        else:
+            raise ValueError(f"Unknown solver '{solver}' for Balbi2020.")
+
+    return {
+        "ROS_mps": ROS.reshape(shape),
+        "FllH_m": FllH.reshape(shape),
+        "iterations": iterations.reshape(shape),
+        "nonConverged": nonConverged.reshape(shape),
+    }
+
+
+def Balbi2020_vectorized(Z, maxEps=0.001, N=100, solver="fixed_point", R0=0.1):
+    """
+    Array evaluation of Balbi2020.
+
+    All scenarios held in Z (scalars or broadcastable arrays) are solved
+    together, see Balbi2020_evaluate for the options and returned values.
+    """
+    return Balbi2020_evaluate(
+        Balbi2020_prepare(Z), Z, maxEps=maxEps, N=N, solver=solver, R0=R0
+    )
+
+
 def Balbi2011(Z, print_calculus=False):
 
     # Fuel Characteristic Parameters
@@ -46,76 +46,110 @@ def Rothermel1972_valuesset():
     }
 
 
-def Rothermel1972(Z, print_calculus=False):
-
-    sa_vol_ratio = Z.SAVcar_ftinv  # Fuel Particle surface area to volume ratio (1/ft)
-    fuel_load = Z.fl1h_lbft2  # Ovendry fuel loading
-    bed_depth = Z.fd_ft  # Fuel depth (ft)
-    dead_extinction_moisture = Z.Dme_r  # Moisture content of extinction
-    moisture_content = Z.mdOnDry1h_r  # Fuel particle moisture content
-    wind = Z.wind_ftmin  # wind velocity at mid flame
-    slope = math.radians(Z.slope_deg)  # slope angle
-    heat_content = Z.H_BTUlb  # Fuel particle low heat content
-    mineral_content = Z.totMineral_r  # Fuel Particle effective mineral content
+def Rothermel1972_prepare(fuel):
+    """
+    Fuel-static part of Rothermel1972.
+
+    Returns a dict with every term that only depends on fuel properties, to be
+    reused by Rothermel1972_evaluate for any number of environments.
+    """
+    sa_vol_ratio = fuel.SAVcar_ftinv  # Particle surface area to volume ratio (1/ft)
+    dead_extinction_moisture = fuel.Dme_r  # Moisture content of extinction
+    heat_content = fuel.H_BTUlb  # Fuel particle low heat content
     effective_mineral_content = (
-        Z.effectMineral_r
+        fuel.effectMineral_r
     )  # Fuel Particle effective mineral content
-    particle_density = Z.fuelDens_lbft3  # Ovendry particle density
 
-    tan_slope = math.tan(slope)  #  in radians
-    preignition = 250 + 1116 * moisture_content
+    # fuel bed quantities shared with the other models, see derived_properties
+    bulk_density = fuel.bulkDens1h_lbft3  # Ovendry bulk density
+    packing_ratio = fuel.packRatio1h_r
+    relative_packing = fuel.relPackRatio1h_r  # packing ratio / optimal packing
+    net_fuel_load = fuel.netLoad1h_lbft2
 
     heating_number = np.exp(-138 / sa_vol_ratio)
 
-    bulk_density = fuel_load / bed_depth
-    packing_ratio = bulk_density / particle_density
-    optimal_packing = 3.348 * sa_vol_ratio**-0.8189
-
-    slope_factor = 5.275 * packing_ratio**-0.3 * tan_slope**2
-
     C = 7.74 * np.exp(-0.133 * sa_vol_ratio**0.55)
     B = 0.02526 * sa_vol_ratio**0.54
     E = 0.715 * np.exp(sa_vol_ratio * -3.59e-4)
-    wind_factor = C * wind**B * (packing_ratio / optimal_packing) ** E
 
     propagating_flux = (192 + 0.2595 * sa_vol_ratio) ** -1 * np.exp(
         (0.792 + 0.681 * sa_vol_ratio**0.5) * (packing_ratio + 0.1)
     )
 
-    mineral_dampening = min(1.0, 0.174 * effective_mineral_content**-0.19)
-
-    rm = min(1.0, moisture_content / dead_extinction_moisture)
-    moisture_dampening = 1 - 2.59 * rm + 5.11 * rm**2 - 3.52 * rm**3
-
-    net_fuel_load = fuel_load * (1 - mineral_content)
+    mineral_dampening = np.minimum(1.0, 0.174 * effective_mineral_content**-0.19)
 
     max_reaction = sa_vol_ratio**1.5 * (495 + 0.0594 * sa_vol_ratio**1.5) ** -1
 
     A = 133 * sa_vol_ratio**-0.7913
 
     optimal_reaction = (
-        max_reaction
-        * (packing_ratio / optimal_packing) ** A
-        * np.exp(A * (1 - packing_ratio / optimal_packing))
+        max_reaction * relative_packing**A * np.exp(A * (1 - relative_packing))
     )
 
-    reaction_intensity = (
-        optimal_reaction
-        * net_fuel_load
-        * heat_content
-        * moisture_dampening
-        * mineral_dampening
-    )
+    # reaction intensity without moisture dampening
+    dry_reaction = optimal_reaction * net_fuel_load * heat_content * mineral_dampening
+
+    return {
+        "dead_extinction_moisture": dead_extinction_moisture,
+        "slope_coef": 5.275 * packing_ratio**-0.3,
+        "wind_coef": C * relative_packing**E,
+        "B": B,
+        "propagating_flux": propagating_flux,
+        "dry_reaction": dry_reaction,
+        "heat_sink": bulk_density * heating_number,
+    }
+
+
+def Rothermel1972_evaluate(prepared, environment):
+    """
+    Environment-dependent part of Rothermel1972.
+
+    prepared is the record returned by Rothermel1972_prepare, environment
+    provides wind, slope and 1h fuel moisture. Both may hold broadcastable
+    arrays, e.g. (n_fuels, 1) fuels against (1, n_envs) environments.
+    """
+    moisture_content = environment.mdOnDry1h_r  # Fuel particle moisture content
+    wind = environment.wind_ftmin  # wind velocity at mid flame
+    slope = environment.slope_rad  # slope angle
+
+    tan_slope = np.tan(slope)  #  in radians
+    preignition = 250 + 1116 * moisture_content
+
+    slope_factor = prepared["slope_coef"] * tan_slope**2
+    wind_factor = prepared["wind_coef"] * wind ** prepared["B"]
+
+    rm = np.minimum(1.0, moisture_content / prepared["dead_extinction_moisture"])
+    moisture_dampening = 1 - 2.59 * rm + 5.11 * rm**2 - 3.52 * rm**3
+
+    reaction_intensity = prepared["dry_reaction"] * moisture_dampening
 
     rate_of_spread = (
         reaction_intensity
-        * propagating_flux
+        * prepared["propagating_flux"]
         * (1 + wind_factor + slope_factor)
-        / (bulk_density * heating_number * preignition)
+        / (prepared["heat_sink"] * preignition)
+    )
+
+    # terms that only depend on the fuel are spread to the shape of the scenarios
+    rate_of_spread, propagating_flux, reaction_intensity = np.broadcast_arrays(
+        rate_of_spread, prepared["propagating_flux"], reaction_intensity
     )
 
+    # [()] gives back NumPy scalars for scalar inputs, arrays are left as is
     return {
-        "ROS_ftmin": rate_of_spread,
-        "PR_r": propagating_flux,
-        "FI_BTUftmin": reaction_intensity,
+        "ROS_ftmin": rate_of_spread[()],
+        "PR_r": propagating_flux[()],
+        "FI_BTUftmin": reaction_intensity[()],
     }
+
+
+def Rothermel1972(Z, print_calculus=False):
+    """
+    Rothermel 1972 rate of spread.
+
+    All operations are NumPy element-wise, so Z may hold scalars or
+    broadcastable arrays (e.g. an array of winds for a single fuel) and the
+    returned values are arrays of the broadcast shape, NumPy scalars when all
+    inputs are scalars.
+    """
+    return Rothermel1972_evaluate(Rothermel1972_prepare(Z), Z)
@@ -185,3 +185,96 @@ def RothermelAndrews2018(Z, print_calculus=False):
         return {"ROS_ftmin": R, "PR_r": RI, "FI_BTUftmin": FI}
     else:
         return {"ROS_ftmin": 0, "PR_r": 0, "FI_BTUftmin": 0}
+
+
+def RothermelAndrews2018_prepare(fuel):
+    """
+    Fuel-static part of RothermelAndrews2018.
+
+    Computes every term that only depends on fuel properties (and model
+    constants) so that it can be reused by RothermelAndrews2018_evaluate for
+    any number of environments. Inputs may be scalars or arrays, the record
+    is a dict of arrays.
+    """
+    wo = np.asarray(fuel.fl1h_lbft2, dtype=float)  # Ovendry fuel loading
+    fpsa = np.asarray(fuel.SAVcar_ftinv, dtype=float)  # Surface area to volume (1/ft)
+    h = np.asarray(fuel.H_BTUlb, dtype=float)  # Fuel particle low heat content
+    st = np.asarray(fuel.totMineral_r, dtype=float)  # Fuel particle mineral content
+    se = np.asarray(fuel.effectMineral_r, dtype=float)  # Effective mineral content
+    mois_ext = np.asarray(fuel.Dme_r, dtype=float)  # Moisture content of extinction
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        ODBD = np.asarray(fuel.bulkDens1h_lbft3, dtype=float)  # Ovendry bulk density
+        Beta = np.asarray(fuel.packRatio1h_r, dtype=float)  # Packing ratio
+        # packing ratio / optimum packing ratio 3.348 * fpsa**-0.8189
+        Beta_rel = np.asarray(fuel.relPackRatio1h_r, dtype=float)
+        WN = wo / (1 + st)  # Net fuel loading
+        A = 133.0 / np.power(fpsa, 0.7913)
+        T_max = np.power(fpsa, 1.5) / (495.0 + 0.0594 * np.power(fpsa, 1.5))
+        T = T_max * np.power(Beta_rel, A) * np.exp(A * (1 - Beta_rel))
+        NS = 0.174 * np.power(se, -0.19)  # Mineral damping
+        PFR = np.exp((0.792 + 0.681 * np.sqrt(fpsa)) * (Beta + 0.1)) / (
+            192.0 + 0.2595 * fpsa
+        )
+        B = 0.02526 * np.power(fpsa, 0.54)
+        C = 7.47 * np.exp(-0.1333 * np.power(fpsa, 0.55))
+        E = 0.715 * np.exp(-3.59 * 10**-4 * fpsa)
+        EHN = np.exp(-138.0 / fpsa)  # Effective Heating Number
+
+        return {
+            "wo": wo,
+            "mois_ext": mois_ext,
+            "RI_dry": T * WN * h * NS,  # reaction intensity without moisture damping
+            "PFR": PFR,
+            "B": B,
+            "WC_coef": C * np.power(Beta_rel, -E),  # WC = WC_coef * wv**B
+            "SC_coef": 5.275 * Beta**-0.3,  # SC = SC_coef * tan_slope**2
+            "heat_sink": ODBD * EHN,  # to be multiplied by the heat of preignition
+            "RT": 384.0 / fpsa,  # residence time
+        }
+
+
+def RothermelAndrews2018_evaluate(prepared, environment):
+    """
+    Environment-dependent part of RothermelAndrews2018.
+
+    prepared is the record returned by RothermelAndrews2018_prepare, environment
+    provides wind, slope and 1h fuel moisture. Arrays of both are broadcast
+    against each other, so a (n_fuels, 1) record and (1, n_envs) environment
+    give (n_fuels, n_envs) outputs. The scalar branches of RothermelAndrews2018
+    (zero load, wind cap, negative slope, RI <= 0) are element-wise masks.
+    """
+    wv = np.asarray(environment.wind_ftmin, dtype=float)  # Midflame wind (ft/min)
+    mf = np.asarray(environment.mdOnDry1h_r, dtype=float)  # Fuel particle moisture
+    tan_slope = np.tan(np.asarray(environment.slope_rad, dtype=float))
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        rm = mf / prepared["mois_ext"]
+        NM = 1.0 - 2.59 * rm + 5.11 * rm**2 - 3.52 * rm**3  # Moisture damping
+        RI = prepared["RI_dry"] * NM
+        wv = np.where(wv > 0.9 * RI, 0.9 * RI, wv)  # wind cap, matches BEHAVE
+        WC = prepared["WC_coef"] * wv ** prepared["B"]
+        SC = np.where(tan_slope >= 0, prepared["SC_coef"] * tan_slope**2, 0.0)
+        QIG = 250.0 + 1116.0 * mf  # Heat of preignition
+        R = RI * prepared["PFR"] * (1 + WC + SC) / (prepared["heat_sink"] * QIG)
+        FI = prepared["RT"] * RI * R
+
+    # zero load or non positive reaction intensity give no spread
+    burning = (prepared["wo"] > 0) & ~(RI <= 0)
+    ROS, PR, FI = np.broadcast_arrays(
+        np.where(burning, R, 0.0),
+        np.where(burning, RI, 0.0),
+        np.where(burning, FI, 0.0),
+    )
+    return {"ROS_ftmin": ROS, "PR_r": PR, "FI_BTUftmin": FI}
+
+
+def RothermelAndrews2018_vectorized(Z):
+    """
+    Array evaluation of RothermelAndrews2018.
+
+    Every Z.*_unit input may be a scalar or a NumPy array (one element per
+    scenario), inputs are broadcast together and the outputs are arrays of the
+    broadcast shape.
+    """
+    return RothermelAndrews2018_evaluate(RothermelAndrews2018_prepare(Z), Z)
@@ -11,9 +11,12 @@ Organization: CNRS
 License: GPL
 
 """
-import math
-import numpy as np
 
+import json
+import struct
+import warnings
+from collections import ChainMap
+import numpy as np
 
 var_properties = {
     "CODE": {"long_name": "Shortname - code", "range": None, "SI_unit": None},
@@ -145,7 +148,6 @@ var_properties = {
         "range": [0.0, 1],
         "SI_unit": None,
     },
-
     # Environment parameters
     "wind": {
         "long_name": "Wind speed at midflame height",
@@ -159,9 +161,6 @@ var_properties = {
         "SI_unit": None,
     },
     "airDens": {"long_name": "Air density", "range": [0.825, 1.225], "SI_unit": None},
-    
-    
-    
     # Model Parameters
     "totMineral": {
         "long_name": "Total fuel particle mineral relative content",
@@ -199,6 +198,50 @@ var_properties = {
     "FllH": {"long_name": "Flame height", "range": None, "SI_unit": "m"},
     "PR": {"long_name": "Propagating flux", "range": None, "SI_unit": None},
     "FI": {"long_name": "Reaction intensity", "range": None, "SI_unit": None},
+    ## Derived Parameters, see derived_properties
+    "bulkDens1h": {
+        "long_name": "Ovendry bulk density of 1h fuel",
+        "range": None,
+        "SI_unit": "kgm3",
+    },
+    "packRatio1h": {
+        "long_name": "Packing ratio of 1h fuel",
+        "range": None,
+        "SI_unit": "r",
+    },
+    "relPackRatio1h": {
+        "long_name": "Packing ratio of 1h fuel relative to the optimum",
+        "range": None,
+        "SI_unit": "r",
+    },
+    "netLoad1h": {
+        "long_name": "Net (mineral-free) 1h fuel load",
+        "range": None,
+        "SI_unit": "kgm2",
+    },
+}
+
+# Parameters computed from others on first access, in SI from the SI values of
+# their dependencies, which may be derived parameters themselves
+derived_properties = {
+    "bulkDens1h": {
+        "dependencies": ("fl1h", "fd"),
+        "compute": lambda fl1h, fd: fl1h / fd,
+    },
+    "packRatio1h": {
+        "dependencies": ("bulkDens1h", "fuelDens"),
+        "compute": lambda bulkDens1h, fuelDens: bulkDens1h / fuelDens,
+    },
+    "relPackRatio1h": {
+        # optimum packing ratio 3.348 * SAV^-0.8189 with SAV in ft⁻¹ (Rothermel 1972)
+        "dependencies": ("packRatio1h", "SAVcar"),
+        "compute": lambda packRatio1h, SAVcar: packRatio1h
+        / (3.348 * (SAVcar / convert_SI["ftinv"]) ** -0.8189),
+    },
+    "netLoad1h": {
+        "dependencies": ("fl1h", "totMineral"),
+        "compute": lambda fl1h, totMineral: fl1h * (1 - totMineral),
+    },
 }
 
 unit_representation = {
@@ -267,6 +310,116 @@ convert_SI = {
 }
 
 
+# Conversion tables shared by all model_parameters instances, a float factor for
+# linear units and a function for angles
+to_SI_converters = {unit: float(factor) for unit, factor in convert_SI.items()}
+from_SI_converters = dict(to_SI_converters)
+to_SI_converters["tan"] = np.arctan  # Output in radians
+from_SI_converters["tan"] = np.tan  # Input expected in radians
+to_SI_converters["deg"] = np.radians  # Degrees to radians
+from_SI_converters["deg"] = np.degrees  # Radians to degrees
+
+# first bytes of model_parameters.to_bytes buffers
+_bytes_magic = b"WROSMP1"
+
+
+def _json_value(value):
+    """True if value can be written to a JSON name table."""
+    try:
+        json.dumps(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _collect_derived_dependents():
+    """Maps each parameter to the derived parameters that depend on it, transitively."""
+    dependents = {}
+
+    def visit(name, derived_name):
+        for dependency in derived_properties[name]["dependencies"]:
+            dependents.setdefault(dependency, set()).add(derived_name)
+            if dependency in derived_properties:
+                visit(dependency, derived_name)
+
+    for derived_name in derived_properties:
+        visit(derived_name, derived_name)
+    return dependents
+
+
+# parameter name -> derived parameters to invalidate when it is set
+_derived_dependents = _collect_derived_dependents()
+
+_converters = {"to_SI": to_SI_converters, "from_SI": from_SI_converters}
+# "name_unit" attribute -> (name, unit, converter), resolved once per direction
+_resolved_attributes = {"to_SI": {}, "from_SI": {}}
+
+
+def resolve_attribute(attr, direction):
+    """
+    Splits a "name_unit" attribute and finds its converter for direction
+    ("to_SI" or "from_SI"). unit is None for plain SI names, converter is None
+    for unsupported units. Results are cached by attribute name.
+    """
+    cache = _resolved_attributes[direction]
+    try:
+        return cache[attr]
+    except KeyError:
+        pass
+    if "_" in attr:
+        param_name, unit = attr.split("_", 1)
+        resolved = (param_name, unit, _converters[direction].get(unit))
+    else:
+        resolved = (attr, None, None)
+    cache[attr] = resolved
+    return resolved
+
+
+def convert_to_SI(value, converter):
+    """Applies a converter of to_SI_converters to a scalar or an array."""
+    if converter.__class__ is float:
+        if isinstance(value, float):
+            return value * converter
+        return np.multiply(value, converter)
+    return converter(value)
+
+
+class _Layers(ChainMap):
+    """
+    ChainMap of the layers of a composed model_parameters. Deleting a key
+    masks it in the view instead of touching the layers, setting it again
+    unmasks it.
+    """
+
+    def __init__(self, *maps):
+        super().__init__(*maps)
+        self.masked = set()
+
+    def __getitem__(self, key):
+        if key in self.masked:
+            return self.__missing__(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return key not in self.masked and super().__contains__(key)
+
+    def __iter__(self):
+        return (key for key in super().__iter__() if key not in self.masked)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __setitem__(self, key, value):
+        self.masked.discard(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.maps[0].pop(key, None)
+        self.masked.add(key)
+
+
 class model_parameters:
     """
     A class to handle and convert measurement units in model parameter data.
@@ -307,24 +460,6 @@ class model_parameters:
     """
 
     def __init__(self, params=None):
-        # Conversion factors
-        self.to_SI = {
-            unit: lambda x, factor=factor: np.multiply(x, factor)
-            for unit, factor in convert_SI.items()
-        }
-        self.from_SI = {
-            unit: lambda x, factor=factor: np.divide(x, factor)
-            for unit, factor in convert_SI.items()
-        }
-
-        # Adjustments for angles
-        self.to_SI["tan"] = lambda x: math.atan(x)  # Output in radians
-        self.from_SI["tan"] = lambda x: math.tan(x)  # Input expected in radians
-
-        # Add explicit radians-to-degrees conversion
-        self.to_SI["deg"] = lambda x: math.radians(x)  # Degrees to radians
-        self.from_SI["deg"] = lambda x: math.degrees(x)  # Radians to degrees
-
         self.SI_params = {}
         self.load(params)
 
@@ -332,39 +467,71 @@ class model_parameters:
         """
         Provides dynamic access to parameters, converting them from SI units to requested units.
         """
-        if "_" in attr:
-            param_name, unit = attr.split("_", 1)
-            if param_name in self.SI_params:
-                if unit in self.from_SI:
-                    return self.from_SI[unit](self.SI_params[param_name])
-                else:
-                    raise AttributeError(f"Conversion to '{unit}' not supported.")
+        param_name, unit, converter = resolve_attribute(attr, "from_SI")
+        try:
+            value = self.__dict__["SI_params"][param_name]
+        except KeyError:
+            if param_name in derived_properties:
+                value = self.get_derived(param_name)
+            elif unit is None:
+                raise AttributeError(f"Attribute '{attr}' not found.")
             else:
                 raise AttributeError(f"Parameter '{param_name}' not found.")
-        else:
-            if attr in self.SI_params:
-                return self.SI_params[attr]
-            else:
-                raise AttributeError(f"Attribute '{attr}' not found.")
+        if unit is None:
+            return value
+        if converter is None:
+            raise AttributeError(f"Conversion to '{unit}' not supported.")
+        if converter.__class__ is float:
+            if isinstance(value, float):
+                return value / converter
+            return np.divide(value, converter)
+        return converter(value)
 
     def __setattr__(self, attr, value):
         """
         Allows setting parameter values, converting them to SI units as necessary.
         """
-        if attr in ["SI_params", "to_SI", "from_SI"] or attr.startswith("_"):
+        if attr == "SI_params" or attr.startswith("_"):
             # Directly set internal attributes
             object.__setattr__(self, attr, value)
         else:
-            param_name, unit = attr.split("_", 1) if "_" in attr else (attr, None)
+            param_name, unit, converter = resolve_attribute(attr, "to_SI")
             if unit:
-                if unit in self.to_SI:
-                    SI_value = self.to_SI[unit](value)
-                    self.SI_params[param_name] = SI_value
-                else:
+                if converter is None:
                     raise AttributeError(f"Conversion from '{unit}' not supported.")
+                self.SI_params[param_name] = convert_to_SI(value, converter)
             else:
                 # If no unit is specified, assume it's already in SI
                 self.SI_params[param_name] = value
+            self._invalidate_derived(param_name)
+
+    def get_derived(self, param_name):
+        """
+        SI value of a parameter of derived_properties, computed from its
+        dependencies on first access and cached with the dependency values it
+        was computed from. The cached value is only reused while the
+        dependencies are the same objects, so that changes made through a
+        layer of a composition are seen too. Arrays modified in place
+        are not: set the parameter again (ParameterBatch column writes do).
+        A value set explicitly under the same name takes precedence.
+        """
+        cache = self.__dict__.setdefault("_derived", {})
+        prop = derived_properties[param_name]
+        dependencies = [getattr(self, name) for name in prop["dependencies"]]
+        if param_name in cache:
+            cached_dependencies, value = cache[param_name]
+            if all(a is b for a, b in zip(cached_dependencies, dependencies)):
+                return value
+        value = prop["compute"](*dependencies)
+        cache[param_name] = (dependencies, value)
+        return value
+
+    def _invalidate_derived(self, param_name):
+        """Drops the cached derived parameters depending on param_name."""
+        cache = self.__dict__.get("_derived")
+        if cache and param_name in _derived_dependents:
+            for derived_name in _derived_dependents[param_name]:
+                cache.pop(derived_name, None)
 
     def __str__(self):
         """
@@ -380,24 +547,50 @@ class model_parameters:
 
     def __add__(self, other):
         """
-        Adds two model_parameters instances, giving priority to the parameters in the first instance.
-        Emits a warning if a parameter is redefined.
+        Composes two model_parameters instances, giving priority to the parameters in the first instance.
+        Emits a single warning listing the redefined parameters, see compose.
         """
         if not isinstance(other, model_parameters):
             raise TypeError(f"Cannot add 'model_parameters' with '{type(other)}'")
 
-        result = model_parameters()
-        # Add all parameters from the first instance (self)
-        for key, value in self.SI_params.items():
-            result.SI_params[key] = value
+        return model_parameters.compose(self, other)
 
-        # Add parameters from the second instance (other), with a warning if already defined
-        for key, value in other.SI_params.items():
-            if key in result.SI_params:
-                print(f"Parameter '{key}' redefined. Keeping the first value.")
+    @staticmethod
+    def compose(*layers, warn=True):
+        """
+        Layered view over several model_parameters, looked up in priority order.
+
+        The first layer holding a parameter wins, nothing is copied: the result
+        reads through to the layers, so later changes of a layer are seen by
+        the composition. Parameters set on the result go to a fresh top layer
+        and never modify the composed instances, nor do deleted parameters,
+        that are only hidden from the result. If warn, the parameters
+        defined in several layers are reported once in a single warning.
+        """
+        maps = [{}]
+        seen = set()
+        redefined = set()
+        for layer in layers:
+            SI_params = layer.SI_params
+            # a view with deleted keys is kept whole to keep them hidden
+            if isinstance(SI_params, ChainMap) and not getattr(
+                SI_params, "masked", None
+            ):
+                maps.extend(SI_params.maps)
             else:
-                result.SI_params[key] = value
+                maps.append(SI_params)
+            keys = SI_params.keys()
+            redefined.update(seen.intersection(keys))
+            seen.update(keys)
 
+        if warn and redefined:
+            warnings.warn(
+                f"Parameters {sorted(redefined)} redefined. Keeping the first values.",
+                stacklevel=2,
+            )
+
+        result = model_parameters()
+        result.SI_params = _Layers(*maps)
         return result
 
     def __getitem__(self, key):
@@ -408,6 +601,7 @@ class model_parameters:
 
     def __delitem__(self, key):
         del self.SI_params[key]
+        self._invalidate_derived(key)
 
     def __iter__(self):
         return iter(self.SI_params)
@@ -432,6 +626,79 @@ class model_parameters:
             for key, value in params.items():
                 self.__setattr__(key, value)
 
+    def __getstate__(self):
+        """
+        Only the SI values are pickled, conversions are rebuilt from the module tables.
+        """
+        return {"SI_params": dict(self.SI_params)}
+
+    def __setstate__(self, state):
+        object.__setattr__(self, "SI_params", dict(state["SI_params"]))
+
+    def to_bytes(self):
+        """
+        Compact binary form: a JSON name table followed by one binary buffer.
+
+        Numeric scalars and arrays are written to the buffer as float64, and
+        booleans as bytes, in name table order. Other values (codes, labels)
+        are kept in the name table and must be JSON values: anything else,
+        e.g. an array of strings, raises a TypeError.
+        """
+        names, shapes, dtypes, buffers, others = [], [], [], [], {}
+        for key, value in self.SI_params.items():
+            array = np.asarray(value)
+            if array.dtype.kind in "biuf":
+                dtype = "|b1" if array.dtype.kind == "b" else "<f8"
+                names.append(key)
+                shapes.append(list(array.shape))
+                dtypes.append(dtype)
+                buffers.append(np.ascontiguousarray(array, dtype=dtype).tobytes())
+            elif array.dtype.kind == "U" and array.ndim == 0:
+                others[key] = str(value)
+            else:
+                others[key] = value
+        try:
+            header = json.dumps(
+                {"names": names, "shapes": shapes, "dtypes": dtypes, "others": others}
+            )
+        except TypeError:
+            unsupported = [
+                key for key, value in others.items() if not _json_value(value)
+            ]
+            raise TypeError(
+                f"Parameters {unsupported} cannot be serialized, only numeric or "
+                "boolean values and JSON values are supported."
+            ) from None
+        header = header.encode("utf-8")
+        return b"".join(
+            [_bytes_magic, struct.pack("<I", len(header)), header] + buffers
+        )
+
+    @staticmethod
+    def from_bytes(data):
+        """
+        Rebuilds a model_parameters from the output of to_bytes.
+        """
+        if data[: len(_bytes_magic)] != _bytes_magic:
+            raise ValueError("Not a serialized model_parameters buffer.")
+        offset = len(_bytes_magic)
+        (header_size,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        header = json.loads(data[offset : offset + header_size].decode("utf-8"))
+        offset += header_size
+
+        params = model_parameters()
+        dtypes = header.get("dtypes", ["<f8"] * len(header["names"]))
+        for key, shape, dtype in zip(header["names"], header["shapes"], dtypes):
+            count = int(np.prod(shape))
+            value = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += value.nbytes
+            params.SI_params[key] = (
+                value.reshape(shape).copy() if shape else value[0].item()
+            )
+        params.SI_params.update(header["others"])
+        return params
+
     @staticmethod
     def str_full_name(attr):
         param_name = ""
@@ -461,10 +728,10 @@ class model_parameters:
     def to_SI(unit, value):
         sh = model_parameters(
             {
-                sh[f"_{unit}"]: value,
+                f"X_{unit}": value,
             }
         )
-        return sh[f"X"]
+        return sh["X"]
 
     @staticmethod
     def get_specialized_properties_set(selected_params):
@@ -507,6 +774,118 @@ class model_parameters:
         return specialized_set
 
 
+class ParameterBatch(model_parameters):
+    """
+    Columnar set of model parameters for batches of scenarios.
+
+    The sampled parameters are stored in SI as the rows of a single
+    (n_params, n_samples) float64 matrix, so that each parameter is one
+    contiguous array, with a name to row index. Parameters that do not vary
+    are taken from base and stay scalars. Accessors are the ones of
+    model_parameters, Z.fl1h_lbft2 returns the converted column, so that the
+    model functions take a batch unchanged.
+
+    names  : keys of the columns of values, with units (e.g. "fl1h_tac", "wind")
+    values : (n_samples, n_params) matrix in the units given by names
+    base   : model_parameters or dict holding the other parameters
+    """
+
+    def __init__(self, names, values, base=None):
+        super().__init__()
+        if base is not None:
+            self.load(
+                dict(base.items()) if isinstance(base, model_parameters) else base
+            )
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        if values.shape[1] != len(names):
+            raise ValueError(
+                f"{values.shape[1]} columns given for {len(names)} parameter names."
+            )
+
+        self._names = list(names)
+        self._index = {}
+        self._columns = np.empty((len(names), values.shape[0]), dtype=np.float64)
+        for j, key in enumerate(names):
+            param_name, unit = key.split("_", 1) if "_" in key else (key, None)
+            if unit is None:
+                self._columns[j] = values[:, j]
+            elif to_SI_converters.get(unit) is not None:
+                self._columns[j] = convert_to_SI(values[:, j], to_SI_converters[unit])
+            else:
+                raise AttributeError(f"Conversion from '{unit}' not supported.")
+            self._index[param_name] = j
+            self.SI_params[param_name] = self._columns[j]
+
+    @classmethod
+    def from_columns(cls, columns, base=None):
+        """
+        Builds a batch from a dict of equally long columns {key_with_unit: values}.
+        """
+        names = list(columns.keys())
+        values = np.column_stack([np.ravel(columns[key]) for key in names])
+        return cls(names, values, base=base)
+
+    def __setattr__(self, attr, value):
+        """
+        Setting a sampled parameter writes into its column, others behave as in model_parameters.
+        """
+        if attr.startswith("_"):
+            return super().__setattr__(attr, value)
+        param_name, unit, converter = resolve_attribute(attr, "to_SI")
+        if param_name in self.__dict__.get("_index", {}):
+            if unit is not None:
+                if converter is None:
+                    raise AttributeError(f"Conversion from '{unit}' not supported.")
+                value = convert_to_SI(value, converter)
+            j = self._index[param_name]
+            self._columns[j] = value
+            # a fresh view, so that the derived values cached by compositions
+            # over the batch, checked by identity, are computed again
+            self.SI_params[param_name] = self._columns[j]
+            self._invalidate_derived(param_name)
+        else:
+            super().__setattr__(attr, value)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for param_name in self._index:
+            del state["SI_params"][param_name]
+        state.update(names=self._names, index=self._index, columns=self._columns)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._names = state["names"]
+        self._index = state["index"]
+        self._columns = state["columns"]
+        for param_name, j in self._index.items():
+            self.SI_params[param_name] = self._columns[j]
+
+    @property
+    def names(self):
+        """Keys of the sampled columns, as given at construction."""
+        return self._names
+
+    @property
+    def size(self):
+        """Number of samples in the batch."""
+        return self._columns.shape[1]
+
+    def get_matrix(self):
+        """Returns the (n_params, n_samples) SI matrix, rows ordered as names."""
+        return self._columns
+
+    def get_sample(self, i):
+        """Returns sample i as a scalar model_parameters, for scalar-only models."""
+        sample = model_parameters()
+        for key, value in self.SI_params.items():
+            sample.SI_params[key] = value[i] if key in self._index else value
+        return sample
+
+
 def test():
 
     A4 = {
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel evaluation helpers
+
+Description:
+Executors to spread model evaluations over threads or processes. A sample
+matrix is split in consecutive row chunks that are evaluated by the executor
+and gathered back in chunk order, so that results do not depend on the
+executor or on the number of workers. With a process pool, the sample and
+result matrices are placed in shared memory blocks (SharedArray) that workers
+attach to by name, reading their rows and writing their results in place
+instead of receiving and returning pickled blocks.
+
+Author: Jean-Baptiste Filippi
+Organization: CNRS
+License: GPL
+
+Usage:
+from wildfire_ROS_models.parallel import map_chunks
+results = map_chunks(function, matrix, args, executor="process")
+"""
+
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from contextlib import ExitStack, contextmanager
+
+import numpy as np
+
+
+class SerialExecutor(Executor):
+    """
+    Executor running every call in the calling thread, in order.
+    """
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        return map(fn, *iterables)
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) now and returns its completed Future."""
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as error:
+            future.set_exception(error)
+        return future
+
+
+executor_types = {
+    "serial": SerialExecutor,
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+@contextmanager
+def get_executor(executor=None, max_workers=None):
+    """
+    Context yielding an executor from a name of executor_types ("serial",
+    "thread" or "process", None being "serial"), created with max_workers and
+    shut down on exit. An Executor instance is yielded as is and left open.
+    """
+    if isinstance(executor, Executor):
+        yield executor
+        return
+    name = "serial" if executor is None else executor
+    if name not in executor_types:
+        raise ValueError(
+            f"Unknown executor '{name}', expected one of {list(executor_types)}."
+        )
+    if name == "serial":
+        yield SerialExecutor()
+        return
+    with executor_types[name](max_workers=max_workers) as pool:
+        yield pool
+
+
+def chunk_bounds(size, chunk_size):
+    """(start, stop) row bounds of consecutive chunks of at most chunk_size rows."""
+    chunk_size = max(int(chunk_size), 1)
+    return [
+        (start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)
+    ]
+
+
+class SharedArray:
+    """
+    NumPy array held in a multiprocessing shared memory block.
+
+    The creating process owns the block: SharedArray.create or from_array
+    allocate it and leaving the context (or unlink) releases it, also on
+    error. An instance pickles as the block name, shape and dtype, so that a
+    worker receiving it attaches to the same memory instead of a copy; the
+    worker only closes its attachment when done.
+
+    Usage:
+    with SharedArray.from_array(samples) as shared:
+        pool.map(worker, [shared] * n, ...)
+    """
+
+    def __init__(self, name, shape, dtype, create=False):
+        # imported here, multiprocessing.shared_memory needs Python 3.8
+        from multiprocessing import shared_memory
+
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        self._block = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self._owner = create
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self._array = np.ndarray(self.shape, dtype=dtype, buffer=self._block.buf)
+
+    @classmethod
+    def create(cls, shape, dtype=np.float64):
+        """New zero-filled shared array, owned by the calling process."""
+        shared = cls(None, shape, dtype, create=True)
+        shared.array[...] = 0
+        return shared
+
+    @classmethod
+    def from_array(cls, array):
+        """New shared array holding a copy of array, owned by the calling process."""
+        array = np.asarray(array)
+        shared = cls(None, array.shape, array.dtype, create=True)
+        shared.array[...] = array
+        return shared
+
+    @property
+    def name(self):
+        return self._block.name
+
+    @property
+    def array(self):
+        """The shared data, valid until close."""
+        if self._array is None:
+            raise ValueError(f"Shared array '{self.name}' is closed.")
+        return self._array
+
+    def __reduce__(self):
+        return (SharedArray, (self.name, self.shape, self.dtype.str))
+
+    def close(self):
+        """Detaches from the block, views of array must not be used afterwards."""
+        if self._array is not None:
+            self._array = None
+            self._block.close()
+
+    def unlink(self):
+        """Closes and, for the owner, frees the block."""
+        self.close()
+        if self._owner:
+            self._owner = False
+            self._block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+
+def _call_on_shared(function, args, source, target, start, stop):
+    """
+    Worker side of map_chunks: evaluates rows of the source SharedArray and
+    writes the result in place in target, or returns it if target is None.
+    """
+    try:
+        rows = source.array[start:stop].copy()
+    finally:
+        source.close()
+    result = function(*args, rows)
+    if target is None:
+        return result
+    try:
+        target.array[start:stop] = result
+    finally:
+        target.close()
+
+
+def _call_on_rows(function, args, rows):
+    return function(*args, rows)
+
+
+def map_chunks(function, matrix, args=(), executor=None, chunk_size=4096, out=None):
+    """
+    Evaluates function(*args, rows) on consecutive chunks of chunk_size rows of
+    matrix and returns the list of the results, in chunk order.
+
+    With out, an array (or SharedArray) with one row per row of matrix, the
+    result of each chunk is written to out[start:stop] and out is returned.
+
+    executor is a name of executor_types or an Executor instance. With a
+    process pool, function must be importable, matrix is placed once in a
+    SharedArray that workers attach to by name, and so is out, that workers
+    fill in place: neither the samples nor the results are pickled. The shared
+    blocks are released when all chunks are done or on error. Process pools
+    need Python 3.8 or later (multiprocessing.shared_memory).
+    """
+    matrix = np.asarray(matrix)
+    bounds = chunk_bounds(len(matrix), chunk_size)
+    n = len(bounds)
+    starts = [start for start, _ in bounds]
+    stops = [stop for _, stop in bounds]
+
+    with get_executor(executor) as pool:
+        if not isinstance(pool, ProcessPoolExecutor):
+            results = pool.map(
+                _call_on_rows,
+                [function] * n,
+                [args] * n,
+                [matrix[start:stop] for start, stop in bounds],
+            )
+            if out is None:
+                return list(results)
+            target = out.array if isinstance(out, SharedArray) else out
+            for start, stop, result in zip(starts, stops, results):
+                target[start:stop] = result
+            return out
+
+        with ExitStack() as blocks:
+            source = blocks.enter_context(SharedArray.from_array(matrix))
+            if out is None or isinstance(out, SharedArray):
+                target = out
+            else:
+                target = blocks.enter_context(SharedArray.create(out.shape, out.dtype))
+            results = list(
+                pool.map(
+                    _call_on_shared,
+                    [function] * n,
+                    [args] * n,
+                    [source] * n,
+                    [target] * n,
+                    starts,
+                    stops,
+                )
+            )
+            if out is None:
+                return results
+            if target is not out:
+                out[...] = target.array
+            return out
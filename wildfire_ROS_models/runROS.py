@@ -11,7 +11,8 @@ helper functions to run and plot models
 import matplotlib.pyplot as plt
 import numpy as np
 
-from .model_set import model_parameters
+from .model_set import model_parameters, ParameterBatch
+from .parallel import map_chunks, SharedArray
 from .RothermelAndrews2018 import *
 from .Rothermel1972 import *
 from .Balbi2020 import *
@@ -33,53 +34,391 @@ def get_values_Balbi2020(input_dict):
 
 
 ROS_models = {
-    "Rothermel1972": {"get_values": Rothermel1972, "get_set": Rothermel1972_valuesset},
+    "Rothermel1972": {
+        "get_values": Rothermel1972,
+        "get_values_vectorized": Rothermel1972,
+        "prepare": Rothermel1972_prepare,
+        "evaluate": Rothermel1972_evaluate,
+        "evaluate_inputs": ["wind", "slope", "mdOnDry1h"],
+        "get_set": Rothermel1972_valuesset,
+        "outputs": ["ROS", "PR", "FI"],
+    },
     "RothermelAndrews2018": {
         "get_values": RothermelAndrews2018,
+        "get_values_vectorized": RothermelAndrews2018_vectorized,
+        "prepare": RothermelAndrews2018_prepare,
+        "evaluate": RothermelAndrews2018_evaluate,
+        "evaluate_inputs": ["wind", "slope", "mdOnDry1h"],
         "get_set": RothermelAndrews2018_valuesset,
+        "outputs": ["ROS", "PR", "FI"],
+    },
+    "Balbi2020": {
+        "get_values": Balbi2020,
+        "get_values_vectorized": Balbi2020_vectorized,
+        "prepare": Balbi2020_prepare,
+        "evaluate": Balbi2020_evaluate,
+        "evaluate_inputs": ["Ta", "slope", "wind", "airDens", "mdOnDry1h"],
+        "get_set": Balbi2020_valuesset,
+        "outputs": ["ROS", "FllH"],
+        "warm_start": "ROS_mps",
     },
-    "Balbi2020": {"get_values": Balbi2020, "get_set": Balbi2020_valuesset},
 }
 
 
-def run_model(ROS_model_name, fuel_model, param_name, values_range):
+def model_outputs(model, values):
+    """
+    Physical outputs of a model call, the SI keys listed in the "outputs"
+    entry of its ROS_models record, leaving out solver diagnostics.
+    """
+    values = model_parameters(values)
+    return model_parameters({key: values[key] for key in model["outputs"]})
 
-    out_values = []
-    initial_value = getattr(fuel_model, param_name)
-    model_function = ROS_models[ROS_model_name]["get_values"]
 
-    for value in values_range:
-        setattr(fuel_model, param_name, value)
-        rset = model_parameters(model_function(fuel_model))
-        setattr(rset, param_name, value)
-        out_values.append(rset)
+def split_outputs(model, values):
+    """
+    Physical outputs of a model call, see model_outputs, and the boolean mask
+    of the points where the model solver did not converge (its
+    "nonConverged" diagnostic, False for models without one).
+    """
+    values = model_parameters(values)
+    nonConverged = np.asarray(values.SI_params.get("nonConverged", False), dtype=bool)
+    return model_outputs(model, values), nonConverged
+
 
-    # retrun to initial value
-    setattr(fuel_model, param_name, initial_value)
+def run_model(
+    ROS_model_name,
+    fuel_model,
+    param_name,
+    values_range,
+    continuation=False,
+    executor=None,
+    chunk_size=4096,
+):
+    """
+    Run a model over values_range of param_name, other parameters taken from fuel_model.
 
-    if len(out_values) == 0:
+    param_name is set to the whole array of values on a layer over fuel_model,
+    which is left unchanged, and models with a vectorized form are evaluated
+    in a single call. Outputs that do not depend on param_name are repeated
+    to the length of values_range.
+
+    With continuation, iterative models (those declaring a "warm_start" output
+    in ROS_models) are solved point by point, seeding each solve with the
+    solution of the previous point of the sweep instead of their default
+    first guess. It has no effect on the other models.
+
+    With an executor (see parallel.map_chunks), values_range is split in
+    chunks of chunk_size values run in the executor and gathered in order.
+    Continuation sweeps are sequential and always run in the calling process.
+    """
+    values = np.asarray(values_range, dtype=float)
+    if values.size == 0:
         return {}
 
-    keys = out_values[0].keys()
+    model = ROS_models[ROS_model_name]
+    warm_start = model.get("warm_start") if continuation else None
+    sweep = model_parameters.compose(fuel_model, warn=False)
+
+    if executor is not None and warm_start is None:
+        chunks = map_chunks(
+            _run_model_rows,
+            values[:, None],
+            (ROS_model_name, fuel_model, param_name),
+            executor,
+            chunk_size,
+        )
+        results = {
+            key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]
+        }
+    elif warm_start is None and "get_values_vectorized" in model:
+        setattr(sweep, param_name, values)
+        results = model_outputs(model, model["get_values_vectorized"](sweep))
+        setattr(results, param_name, values)
+        results = {
+            key: np.array(np.broadcast_to(value, values.shape))
+            for key, value in results.items()
+        }
+    else:
+        out_values = []
+        guess = {}
+        for value in values:
+            setattr(sweep, param_name, value)
+            rset = model_outputs(model, model["get_values"](sweep, **guess))
+            setattr(rset, param_name, value)
+            out_values.append(rset)
+            if warm_start is not None:
+                previous = rset[warm_start]
+                guess = (
+                    {"R0": previous} if np.isfinite(previous) and previous > 0 else {}
+                )
+        results = {
+            key: np.array([result[key] for result in out_values])
+            for key in out_values[0].keys()
+        }
+
+    return {
+        "Model": ROS_model_name,
+        "FUELCODE": fuel_model.CODE,
+        "results": model_parameters(results),
+    }
+
+
+def _run_model_rows(ROS_model_name, fuel_model, param_name, rows):
+    """Chunk of a run_model sweep, rows being a column of values."""
+    sweep = run_model(ROS_model_name, fuel_model, param_name, rows[:, 0])
+    return dict(sweep["results"].items())
+
+
+def _evaluate_rows(model_key, base, names, rows):
+    """
+    Outputs of a model for rows of values of the names parameters, the rows
+    being mapped to the columns of a ParameterBatch and evaluated in one
+    vectorized call, or point by point for models without a vectorized form.
+    Only the physical outputs are returned, nan where the model reports that
+    its solver did not converge.
+    """
+    model = ROS_models[model_key]
+    if "get_values_vectorized" in model:
+        outputs = evaluate_batch(model, ParameterBatch(names, rows, base=base))
+        outputs, nonConverged = split_outputs(model, outputs)
+        return {
+            key: np.where(nonConverged, np.nan, value) for key, value in outputs.items()
+        }
+
+    params = model_parameters.compose(base, warn=False)
+    out_values = []
+    for row in rows:
+        for name, value in zip(names, row):
+            setattr(params, name, value)
+        out_values.append(model_outputs(model, model["get_values"](params)))
+    return {
+        key: np.array([result[key] for result in out_values])
+        for key in out_values[0].keys()
+    }
+
+
+def _evaluate_rows_matrix(model_key, base, names, keys, rows):
+    """Outputs of _evaluate_rows as a (len(rows), len(keys)) matrix."""
+    outputs = _evaluate_rows(model_key, base, names, rows)
+    return np.column_stack([outputs[key] for key in keys])
+
+
+def output_names(model_key):
+    """
+    Names (SI keys) of the physical outputs of a model, in the order of the
+    evaluate_samples columns.
+    """
+    return list(ROS_models[model_key]["outputs"])
+
+
+def evaluate_samples(
+    model_key, base, names, samples, executor=None, chunk_size=4096, out=None
+):
+    """
+    Outputs of a model for every row of samples, a (n_samples, len(names))
+    matrix of values of the names parameters (with units, e.g. "fl1h_tac"),
+    the other parameters being taken from base.
 
-    for item in out_values:
-        keys = out_values[0].keys()
+    Rows are evaluated by chunks of chunk_size in executor, see
+    parallel.map_chunks, each chunk writing its outputs in place in a
+    (n_samples, n_outputs) float64 matrix, given as out (array or
+    parallel.SharedArray) or allocated, its columns in the order of
+    output_names, nan for the samples where the model solver did not
+    converge. Returns a model_parameters holding one column of the matrix per
+    output, views that are only valid while a SharedArray out is open.
 
-    result_arrays = {}
+    Setting non converged samples to nan departs from the models themselves,
+    that return their last iterate there (as run_model does), and only
+    applies to models evaluated by batches (get_values_vectorized).
+    """
+    samples = np.asarray(samples)
+    if len(samples) == 0:
+        return model_parameters()
+    keys = output_names(model_key)
+    if out is None:
+        out = np.empty((len(samples), len(keys)))
 
+    map_chunks(
+        _evaluate_rows_matrix,
+        samples,
+        (model_key, base, names, keys),
+        executor,
+        chunk_size,
+        out=out,
+    )
+    matrix = out.array if isinstance(out, SharedArray) else out
+    return model_parameters({key: matrix[:, j] for j, key in enumerate(keys)})
+
+
+def evaluate_batch(model, batch):
+    """
+    Outputs of a ROS_models entry for a ParameterBatch, one array of
+    batch.size values per output key (SI names), from a single vectorized
+    call when the model has one and point by point otherwise.
+    """
+    shape = (batch.size,)
+    if "get_values_vectorized" in model:
+        results = model_parameters(model["get_values_vectorized"](batch))
+        return {key: np.broadcast_to(value, shape) for key, value in results.items()}
+
+    out_values = [
+        model_parameters(model["get_values"](batch.get_sample(i)))
+        for i in range(batch.size)
+    ]
+    return {
+        key: np.array([result[key] for result in out_values])
+        for key in out_values[0].keys()
+    }
+
+
+def run_grid(ROS_model_name, fuel_model, grid, chunk_size=65536):
+    """
+    Run a model over the full factorial product of the values in grid.
+
+    grid is a dict {param_name: values}, each entry being an axis of the
+    outputs, in the dict order. fuel_model gives the other parameters and may
+    also be a list of parameter sets, adding a leading "fuel" axis. No object
+    is built per point: the product is evaluated by flat blocks of at most
+    chunk_size points, each one a ParameterBatch over the fuel evaluated in a
+    single vectorized call, so that only one block of temporaries is alive.
+
+    Returns {"Model", "FUELCODE", "dims", "coords", "results",
+    "nonConverged"}, dims being the axis names, coords the values along each
+    axis, results a model_parameters holding one array of the grid shape per
+    physical output (see model_outputs) and nonConverged the boolean grid of
+    the points where the model solver did not converge.
+    """
+    single_fuel = isinstance(fuel_model, model_parameters)
+    fuels = [fuel_model] if single_fuel else list(fuel_model)
+    model = ROS_models[ROS_model_name]
+
+    names = list(grid.keys())
+    coords = {name: np.asarray(values, dtype=float) for name, values in grid.items()}
+    shape = tuple(coords[name].size for name in names)
+    size = int(np.prod(shape))
+
+    results = {}
+    nonConverged = np.zeros((len(fuels), size), dtype=bool)
+    for f, fuel in enumerate(fuels):
+        for start in range(0, size, chunk_size):
+            stop = min(start + chunk_size, size)
+            index = np.unravel_index(np.arange(start, stop), shape)
+            values = np.column_stack([coords[name][i] for name, i in zip(names, index)])
+            outputs = evaluate_batch(model, ParameterBatch(names, values, base=fuel))
+            outputs, nonConverged[f, start:stop] = split_outputs(model, outputs)
+            for key, value in outputs.items():
+                if key not in results:
+                    results[key] = np.empty((len(fuels), size))
+                results[key][f, start:stop] = value
+
+    if single_fuel:
+        dims = names
+        codes = fuel_model.CODE
+    else:
+        dims = ["fuel"] + names
+        codes = [fuel.CODE for fuel in fuels]
+        coords = {"fuel": codes, **coords}
+        shape = (len(fuels),) + shape
+    results = {key: value.reshape(shape) for key, value in results.items()}
+
+    return {
+        "Model": ROS_model_name,
+        "FUELCODE": codes,
+        "dims": dims,
+        "coords": coords,
+        "results": model_parameters(results),
+        "nonConverged": nonConverged.reshape(shape),
+    }
+
+
+def stack_fuels(fuels):
+    """
+    Single model_parameters holding every numeric parameter of a list of fuels
+    as a (n_fuels, 1) SI column, to be broadcast against (1, n_envs)
+    environments. A parameter missing or not numeric for some fuel is nan for
+    it, parameters that are never numeric (codes, types) are left out.
+    """
+    keys = dict.fromkeys(key for fuel in fuels for key in fuel.keys())
+    stacked = model_parameters()
     for key in keys:
-        result_arrays[key] = []
+        column = [fuel.SI_params.get(key) for fuel in fuels]
+        numeric = [
+            np.ndim(value) == 0 and np.asarray(value).dtype.kind in "iuf"
+            for value in column
+        ]
+        if any(numeric):
+            stacked.SI_params[key] = np.array(
+                [float(v) if ok else np.nan for v, ok in zip(column, numeric)]
+            )[:, None]
+    return stacked
+
+
+def run_fuel_catalog(ROS_model_name, fuels, environments, chunk_size=4096):
+    """
+    Run a model for every fuel of a catalog against every state of an
+    environment table.
+
+    fuels is a list of parameter sets, environments a model_parameters or dict
+    of arrays of n_envs values (e.g. {"wind_mps": ..., "mdOnDry1h_r": ...}),
+    parameters not given there being taken from each fuel. The two axes are
+    kept apart: fuels are stacked as (n_fuels, 1) columns and prepared once,
+    environments are sliced in (1, chunk_size) blocks and broadcast against
+    them in the model evaluate step, so inputs scale with n_fuels + n_envs and
+    only one (n_fuels, chunk_size) block of temporaries is alive.
 
-    for result in out_values:
-        for key in keys:
-            result_arrays[key].append(result[key])
+    The evaluate step only reads the "evaluate_inputs" of the model. If
+    environments also set fuel-static parameters, each block is instead run
+    through the full vectorized model, fuel preparation included, so that
+    these values override the ones of the fuels.
+
+    Returns {"Model", "FUELCODE", "dims", "results", "nonConverged"}, results
+    holding one (n_fuels, n_envs) array per physical output (see
+    model_outputs) and nonConverged the boolean (n_fuels, n_envs) table of
+    the points where the model solver did not converge.
+    """
+    model = ROS_models[ROS_model_name]
+    fuels = list(fuels)
+    if not isinstance(environments, model_parameters):
+        environments = model_parameters(environments)
+    n_envs = max((np.size(value) for value in environments.values()), default=1)
+
+    fuel_columns = stack_fuels(fuels)
+    fuel_static = set(environments.keys()) - set(model.get("evaluate_inputs", []))
+    if "prepare" in model and not fuel_static:
+        prepared = model["prepare"](fuel_columns)
+    else:
+        prepared = None
+
+    results = {}
+    nonConverged = np.zeros((len(fuels), n_envs), dtype=bool)
+    for start in range(0, n_envs, chunk_size):
+        stop = min(start + chunk_size, n_envs)
+        block = model_parameters(
+            {
+                key: np.asarray(value)[None, start:stop] if np.ndim(value) else value
+                for key, value in environments.items()
+            }
+        )
+        scenario = model_parameters.compose(block, fuel_columns, warn=False)
+        if prepared is not None:
+            outputs = model["evaluate"](prepared, scenario)
+        else:
+            outputs = model["get_values_vectorized"](scenario)
+
+        outputs, failed = split_outputs(model, outputs)
+        nonConverged[:, start:stop] = failed
+        for key, value in outputs.items():
+            value = np.broadcast_to(value, (len(fuels), stop - start))
+            if key not in results:
+                results[key] = np.empty((len(fuels), n_envs), dtype=value.dtype)
+            results[key][:, start:stop] = value
 
     return {
         "Model": ROS_model_name,
-        "FUELCODE": fuel_model.CODE,
-        "results": model_parameters(
-            {key: np.array(result_arrays[key]) for key in keys}
-        ),
+        "FUELCODE": [fuel.SI_params.get("CODE") for fuel in fuels],
+        "dims": ["fuel", "environment"],
+        "results": model_parameters(results),
+        "nonConverged": nonConverged,
     }
 
 
@@ -4,7 +4,7 @@
 Sensitivity Analysis Script for wildfire_ROS_models Models
 
 This script provides helper functions to perform and plot sensitivity analysis
-using the Sobol method.
+using the Sobol method, optionally after a Morris screening of the parameters.
 
 Created on Wed Nov 22 12:14:58 2023
 
@@ -12,36 +12,36 @@ Author: filippi_j, Thoreau_r
 """
 
 import argparse
+import hashlib
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from types import MethodType
 import matplotlib.pyplot as plt
 import numpy as np
+from scipy.stats import norm, qmc
 from sklearn.model_selection import train_test_split
-from SALib.analyze import sobol
+from SALib.analyze import morris, sobol
+from SALib.sample import morris as morrissample
 from SALib.sample import sobol as sobolsample
-from wildfire_ROS_models.runROS import ROS_models
+from SALib.util import scale_samples
+from wildfire_ROS_models import fuels_database as fdb
+from wildfire_ROS_models.runROS import (
+    ROS_models,
+    evaluate_samples,
+    output_names,
+    run_fuel_catalog,
+    stack_fuels,
+)
+from wildfire_ROS_models.parallel import SharedArray, get_executor, map_chunks
 from wildfire_ROS_models.model_set import model_parameters, var_properties
 
 
-def generate_problem_set(
-    model_key,
-    kind_of_parameter=["environment", "typical", "fuelstate", "model"],
-    result_var="ROS",
-    N=4096,
-    val_prop=None,
-    selected_params=None,
-):
+def default_parameters(model_key):
     """
-    Generate a problem set for sensitivity analysis using the Sobol method.
-
-    Parameters:
-        model_key (str): Key identifying the ROS model.
-        kind_of_parameter (list): List of parameter categories to include.
-        result_var (str): The result variable to analyze.
-        N (int): Number of samples to generate.
-        val_prop (float): Proportion of validation data.
-        selected_params (list): selection of parameters to use.
-
-    Returns:
-        dict: A dictionary containing the problem setup and results.
+    Parameters of every group of the model values set, as a single model_parameters.
     """
     modelVSet = ROS_models[model_key]["get_set"]()
 
@@ -49,9 +49,107 @@ def generate_problem_set(
 
     for key in modelVSet.keys():
         for var_key in modelVSet[key]:
-
             fm[var_key] = modelVSet[key][var_key]
 
+    return model_parameters(fm)
+
+
+def saltelli_rows(base_sequence, calc_second_order=True):
+    """
+    Saltelli cross-sampling of Sobol base points, as in SALib sobol.sample.
+
+    base_sequence is (n, 2D), its first D columns being the A matrix and the
+    last D the B matrix. Returns the n * (2D + 2) rows A, AB_1..AB_D,
+    BA_1..BA_D, B of each point (n * (D + 2) rows, without BA, if not
+    calc_second_order), in the unit hypercube.
+    """
+    n, D = base_sequence.shape[0], base_sequence.shape[1] // 2
+    A = base_sequence[:, :D]
+    B = base_sequence[:, D:]
+    diagonal = np.arange(D)
+
+    AB = np.repeat(A[:, None, :], D, axis=1)
+    AB[:, diagonal, diagonal] = B
+    blocks = [A[:, None, :], AB]
+    if calc_second_order:
+        BA = np.repeat(B[:, None, :], D, axis=1)
+        BA[:, diagonal, diagonal] = A
+        blocks.append(BA)
+    blocks.append(B[:, None, :])
+
+    return np.concatenate(blocks, axis=1).reshape(-1, D)
+
+
+def sobol_blocks(problem, N, block_size, calc_second_order=True, seed=None):
+    """
+    Generates the rows of sobolsample.sample(problem, N, seed=seed) by blocks.
+
+    Yields (start_row, rows) pairs, each block holding the scaled Saltelli
+    rows of block_size consecutive Sobol base points, so that only one block
+    is in memory. Use powers of 2 for N and block_size to keep the balance
+    properties of the sequence. Problems with groups are not supported.
+    """
+    D = problem["num_vars"]
+    engine = qmc.Sobol(d=2 * D, scramble=True, seed=seed)
+    rows_per_point = 2 * D + 2 if calc_second_order else D + 2
+    for start in range(0, N, block_size):
+        base_sequence = engine.random(min(block_size, N - start))
+        rows = saltelli_rows(base_sequence, calc_second_order)
+        yield start * rows_per_point, scale_samples(rows, problem)
+
+
+def _allocate(shape, directory, name, mode="w+"):
+    """Array of shape in memory, or memory-mapped in directory/name.npy."""
+    if directory is None:
+        return np.empty(shape)
+    os.makedirs(directory, exist_ok=True)
+    return np.lib.format.open_memmap(
+        os.path.join(directory, f"{name}.npy"), mode=mode, shape=shape
+    )
+
+
+def _checkpoint_manifest(directory, definition, seed, resume):
+    """
+    Manifest of a checkpointed generation in directory: the one found there if
+    resume and it records the same problem definition (and seed, if given),
+    a new one with no completed block otherwise. A new manifest draws a seed
+    when none is given, so that resumed runs sample the same sequence.
+    """
+    path = os.path.join(directory, "manifest.json")
+    digest = hashlib.sha256(
+        json.dumps(definition, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+    if resume and os.path.exists(path):
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest["hash"] != digest or seed not in (None, manifest["seed"]):
+            raise ValueError(
+                f"'{directory}' holds the checkpoint of another problem or seed, "
+                "use another directory or resume=False."
+            )
+        return manifest
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return {"hash": digest, "seed": seed, "definition": definition, "completed": []}
+
+
+def _write_manifest(directory, manifest):
+    """Replaces the manifest of directory in one step, never leaving it partial."""
+    path = os.path.join(directory, "manifest.json")
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _build_problem(model_key, kind_of_parameter, selected_params):
+    """
+    SALib problem definition (names and bounds) of the sampled parameters.
+    Unless selected, parameters without a range are left at their values.
+    """
+    modelVSet = ROS_models[model_key]["get_set"]()
+
     fm_var_set = {}
 
     for key in kind_of_parameter:
@@ -67,6 +165,11 @@ def generate_problem_set(
 
     s_properties = model_parameters.get_specialized_properties_set(fm_var_set.keys())
 
+    if selected_params is None:
+        fm_var_set = {
+            k: v for k, v in fm_var_set.items() if s_properties[k]["range"] is not None
+        }
+
     problem = {
         "model_name": model_key,
         "num_vars": len(fm_var_set.keys()),
@@ -74,81 +177,794 @@ def generate_problem_set(
         "bounds": [s_properties[name]["range"] for name in fm_var_set.keys()],
     }
 
-    print("SSSSS ", problem["bounds"], fm_var_set.keys())
-    param_values = sobolsample.sample(problem, N)
-    problem["input"] = param_values
+    return problem
 
-    model_results = []
-    for params in param_values:
-        for i, param_name in enumerate(problem["names"]):
-            fm[param_name] = params[i]
-        fm = model_parameters(fm)
-        result = model_parameters(ROS_models[model_key]["get_values"](fm))
 
-        model_results.append(result[result_var])
+def output_column(problem_set, name):
+    """
+    Values of the name output (SI key, or with units e.g. "FI_BTUftmin") for
+    every sample of a problem set, a view of its outputs matrix for SI keys.
+    """
+    outputs = problem_set["outputs"]
+    keys = problem_set["output_names"]
+    if name in keys:
+        return outputs[:, keys.index(name)]
+    columns = model_parameters({key: outputs[:, j] for j, key in enumerate(keys)})
+    return np.asarray(columns[name])
 
+
+def generate_problem_set(
+    model_key,
+    kind_of_parameter=["environment", "typical", "fuelstate", "model"],
+    result_var="ROS",
+    N=4096,
+    val_prop=None,
+    selected_params=None,
+    executor=None,
+    chunk_size=4096,
+    seed=None,
+    block_size=None,
+    directory=None,
+    resume=True,
+):
+    """
+    Generate a problem set for sensitivity analysis using the Sobol method.
+
+    Every output of the model is kept: "outputs" is the (samples, outputs)
+    matrix of the values, in the order of the SI keys of "output_names", and
+    "results" the result_var column (see output_column), so that indices of
+    any output can be computed from the same evaluation (see sobol_analysis).
+    Outputs are nan for the samples where the model solver did not converge
+    (see runROS.evaluate_samples), instead of the last iterate the model
+    returns point by point, and these base samples are left out of the
+    analyses.
+
+    With block_size, samples are streamed: the Sobol/Saltelli rows are
+    generated by blocks of block_size base samples (see sobol_blocks), each
+    block is evaluated and written to preallocated input and output arrays,
+    memory-mapped as input.npy and outputs.npy in directory if given, so that
+    peak memory is bounded by the block size. The samples are the ones of the
+    direct generation with the same seed.
+
+    With directory, the generation is also checkpointed: after each block the
+    arrays are flushed and directory/manifest.json records the hash of the
+    problem definition, the seed and the completed blocks. Calling again with
+    the same problem resumes from the completed blocks (unless resume is
+    False), a different problem or seed in the same directory is an error.
+
+    Parameters:
+        model_key (str): Key identifying the ROS model.
+        kind_of_parameter (list): List of parameter categories to include.
+        result_var (str): The result variable to analyze, stored as "results".
+        N (int): Number of samples to generate.
+        val_prop (float): Proportion of validation data.
+        selected_params (list): selection of parameters to use.
+        executor (str or Executor): "serial", "thread" or "process" evaluation
+            of the samples, see parallel.map_chunks.
+        chunk_size (int): Number of samples per evaluation chunk.
+        seed (int): Seed of the scrambled Sobol sequence.
+        block_size (int): Number of base samples per streamed block.
+        directory (str): Where to memory-map and checkpoint streamed inputs
+            and results, streaming by blocks of 4096 if block_size is None.
+        resume (bool): Whether to resume from a checkpoint in directory.
+
+    Returns:
+        dict: A dictionary containing the problem setup and results.
+    """
+    problem = _build_problem(model_key, kind_of_parameter, selected_params)
+
+    base = default_parameters(model_key)
+    with get_executor(executor) as pool:
+        if block_size is None and directory is None:
+            param_values = sobolsample.sample(problem, N, seed=seed)
+            keys = output_names(model_key)
+            outputs = np.empty((len(param_values), len(keys)))
+            evaluate_samples(
+                model_key,
+                base,
+                problem["names"],
+                param_values,
+                executor=pool,
+                chunk_size=chunk_size,
+                out=outputs,
+            )
+        else:
+            block_size = 4096 if block_size is None else block_size
+            manifest = None
+            if directory is not None:
+                definition = {
+                    "model_name": model_key,
+                    "names": problem["names"],
+                    "bounds": [
+                        [float(b) for b in bound] for bound in problem["bounds"]
+                    ],
+                    "N": N,
+                    "block_size": block_size,
+                }
+                manifest = _checkpoint_manifest(directory, definition, seed, resume)
+                seed = manifest["seed"]
+            completed = set(manifest["completed"]) if manifest else set()
+            mode = "r+" if completed else "w+"
+
+            n_rows = N * (2 * problem["num_vars"] + 2)
+            shape = (n_rows, problem["num_vars"])
+            keys = output_names(model_key)
+            param_values = _allocate(shape, directory, "input", mode)
+            outputs = _allocate((n_rows, len(keys)), directory, "outputs", mode)
+            blocks = sobol_blocks(problem, N, block_size, seed=seed)
+            for block, (start, rows) in enumerate(blocks):
+                if block in completed:
+                    continue
+                stop = start + len(rows)
+                param_values[start:stop] = rows
+                evaluate_samples(
+                    model_key,
+                    base,
+                    problem["names"],
+                    rows,
+                    executor=pool,
+                    chunk_size=chunk_size,
+                    out=outputs[start:stop],
+                )
+                if manifest is not None:
+                    param_values.flush()
+                    outputs.flush()
+                    manifest["completed"].append(block)
+                    _write_manifest(directory, manifest)
+
+    problem["input"] = param_values
     problem["result_var"] = result_var
-    problem["results"] = np.array(model_results)
+    problem["output_names"] = keys
+    problem["outputs"] = outputs
+    problem["results"] = output_column(problem, result_var)
 
     if val_prop is not None:
-        X_train, X_val, y_train, y_val = train_test_split(
-            problem["input"], problem["results"], test_size=val_prop
+        X_train, X_val, y_train, y_val, o_train, o_val = train_test_split(
+            problem["input"], problem["results"], problem["outputs"], test_size=val_prop
         )
         problem["input"] = {"train": X_train, "val": X_val}
         problem["results"] = {"train": y_train, "val": y_val}
+        problem["outputs"] = {"train": o_train, "val": o_val}
 
     return problem
 
 
-def verify_error(problem_set, lookat="results"):
+def _error_summary(computed, stored, quantiles):
+    """Error statistics of stored values against the computed model values."""
+    diff = np.abs(computed - stored)
+    finite = np.isfinite(diff)
+    diff = diff[finite]
+    scale = np.abs(computed[finite])
+    relative = diff[scale > 0] / scale[scale > 0]
+    if relative.size:
+        relative_quantiles = np.quantile(relative, quantiles)
+    else:
+        relative_quantiles = np.full(len(quantiles), np.nan)
+    return {
+        "n": diff.size,
+        "MAE": np.mean(diff) if diff.size else np.nan,
+        "RMSE": np.sqrt(np.mean(diff**2)) if diff.size else np.nan,
+        "max": np.max(diff) if diff.size else np.nan,
+        "relative_quantiles": dict(zip(quantiles, relative_quantiles)),
+    }
+
+
+def error_metrics(
+    problem_set,
+    lookat="results",
+    quantiles=(0.5, 0.9, 0.99),
+    executor=None,
+    chunk_size=4096,
+):
+    """
+    Error statistics between the model's results and the problem set.
+
+    The model is re-run once over all the inputs, in batches (see
+    verify_error), and the stored problem_set[lookat] values are compared to
+    it. Samples where either value is not finite are left out.
+
+    Parameters:
+        problem_set (dict): The problem set containing inputs and results,
+            plain or split in "train" and "val" parts.
+        lookat (str): The key to look at in the problem set.
+        quantiles (tuple): Quantiles of the relative error |stored - model| / |model|.
+        executor (str or Executor): "serial", "thread" or "process" evaluation
+            of the samples, see parallel.map_chunks.
+        chunk_size (int): Number of samples per evaluation chunk.
+
+    Returns:
+        dict: "n" (compared samples), "MAE", "RMSE", "max" absolute error and
+        "relative_quantiles" {quantile: relative error}, or one such dict per
+        part for split problem sets.
+    """
+    model_key = problem_set["model_name"]
+    inputs = problem_set["input"]
+    stored = problem_set[lookat]
+    parts = list(inputs.keys()) if isinstance(inputs, dict) else [None]
+    samples = (
+        np.concatenate([inputs[part] for part in parts]) if parts != [None] else inputs
+    )
+
+    outputs = evaluate_samples(
+        model_key,
+        default_parameters(model_key),
+        problem_set["names"],
+        samples,
+        executor=executor,
+        chunk_size=chunk_size,
+    )
+    computed = np.asarray(outputs[problem_set["result_var"]])
+
+    metrics = {}
+    start = 0
+    for part in parts:
+        values = np.asarray(stored if part is None else stored[part], dtype=float)
+        values = values.reshape(-1)
+        metrics[part] = _error_summary(
+            computed[start : start + values.size], values, quantiles
+        )
+        start += values.size
+
+    return metrics[None] if parts == [None] else metrics
+
+
+def verify_error(problem_set, lookat="results", executor=None, chunk_size=4096):
     """
     Verify the error between the model's results and the generated problem set.
 
     Parameters:
         problem_set (dict): The problem set containing inputs and results.
         lookat (str): The key to look at in the problem set.
+        executor (str or Executor): "serial", "thread" or "process" evaluation
+            of the samples, see parallel.map_chunks.
+        chunk_size (int): Number of samples per evaluation chunk.
 
     Returns:
-        float: The average absolute error.
+        float: The average absolute error, per part for split problem sets.
+        See error_metrics for the other statistics.
     """
-    model_key = problem_set["model_name"]
-    modelVSet = ROS_models[model_key]["get_set"]()
-    fm = model_parameters(modelVSet)
-    diff = 0
-    numSamples = len(problem_set[lookat])
+    metrics = error_metrics(
+        problem_set, lookat, executor=executor, chunk_size=chunk_size
+    )
+    if "MAE" in metrics:
+        return metrics["MAE"]
+    return {part: part_metrics["MAE"] for part, part_metrics in metrics.items()}
+
+
+def warn_dropped(kept, total, what="base samples"):
+    """
+    Warns when only kept of total samples (base samples, trajectories) have
+    finite results. Which samples fail (e.g. where a model solver does not
+    converge) depends on the sampled parameters, so indices computed from the
+    others only may be biased.
+    """
+    if kept < total:
+        warnings.warn(
+            f"Only {kept} of {total} {what} have finite results, the indices "
+            "are computed from these ones and may be biased.",
+            RuntimeWarning,
+            stacklevel=3,
+        )
+
+
+def finite_points(problem, Y, calc_second_order=True, warn=True):
+    """
+    Y without the Sobol base samples that hold a non finite value in any of
+    their Saltelli rows (e.g. a model solver that did not converge), so that
+    the estimators average over complete base samples only. If warn, dropped
+    base samples are reported, see warn_dropped.
+    """
+    D = problem["num_vars"]
+    points = np.asarray(Y, dtype=float).reshape(
+        -1, 2 * D + 2 if calc_second_order else D + 2
+    )
+    finite = np.isfinite(points).all(axis=1)
+    if warn:
+        warn_dropped(int(finite.sum()), len(finite))
+    return points[finite].reshape(-1)
+
 
-    #  for key in modelVSet.keys():
-    #     fm = fm + modelVSet[key]
+def _bootstrap_estimates(points, D, resamples):
+    """
+    Sobol index estimates of bootstrap resamples, each row of resamples being
+    the indices of the base samples of one resample. points holds the outputs
+    of the Saltelli rows of each of the N base samples of D parameters, A, AB
+    (, BA), B, as a (N, 2D+2) or, without second order, (N, D+2) array or
+    SharedArray, the latter being closed when done. Returns a
+    (len(resamples), n) matrix of the S1 then ST estimates of each parameter,
+    followed by the S2 estimates of each pair j < k if points has BA.
+
+    Every resample is reduced along its own row, so that its estimates do not
+    depend on the other resamples of the block.
+    """
+    if isinstance(points, SharedArray):
+        try:
+            return _bootstrap_estimates(points.array, D, resamples)
+        finally:
+            points.close()
+
+    resamples = np.ascontiguousarray(resamples)
+    a, b = points[:, 0][resamples], points[:, -1][resamples]
+    y_var = np.var(np.concatenate([a, b], axis=1), axis=1)
+    scale = np.divide(
+        1.0, y_var, out=np.zeros_like(y_var), where=y_var > np.finfo(float).eps
+    )
+    ab = [points[:, 1 + j][resamples] for j in range(D)]
+    S1 = [np.mean(b * (ab[j] - a), axis=1) * scale for j in range(D)]
+    ST = [0.5 * np.mean((a - ab[j]) ** 2, axis=1) * scale for j in range(D)]
+    S2 = []
+    if points.shape[1] == 2 * D + 2:
+        a_b = a * b
+        for j in range(D):
+            ba = points[:, 1 + D + j][resamples]
+            for k in range(j + 1, D):
+                Vjk = np.mean(ba * ab[k] - a_b, axis=1) * scale
+                S2.append(Vjk - S1[j] - S1[k])
+    return np.column_stack(S1 + ST + S2)
+
+
+def sobol_indices(
+    problem,
+    Y,
+    calc_second_order=True,
+    num_resamples=100,
+    conf_level=0.95,
+    seed=None,
+    executor=None,
+    chunk_size=16,
+    warn=True,
+):
+    """
+    Sobol indices with bootstrap confidence intervals, as SALib sobol.analyze.
+
+    The indices are the ones of SALib and the bootstrap resamples are drawn
+    as SALib does for the same seed. The resamples are then evaluated by
+    vectorized blocks of chunk_size resamples in executor (see
+    parallel.map_chunks), so that the confidence intervals are the same
+    whatever the executor and chunk size, and match the serial SALib ones to
+    rounding. A process pool reads the outputs from one SharedArray instead
+    of receiving a copy of them with every block. Base samples with a non
+    finite value are left out, see finite_points. Problems with groups are
+    not supported.
+
+    Parameters:
+        problem (dict): The problem definition.
+        Y (numpy.ndarray): Model outputs of the Sobol samples.
+        calc_second_order (bool): Whether to compute S2.
+        num_resamples (int): Number of bootstrap resamples.
+        conf_level (float): Confidence level of the intervals.
+        seed (int): Seed of the bootstrap.
+        executor (str or Executor): "serial", "thread" or "process"
+            evaluation of the resamples.
+        chunk_size (int): Number of resamples per block.
+        warn (bool): Whether to warn about dropped base samples.
+
+    Returns:
+        ResultDict: "S1", "S1_conf", "ST", "ST_conf" (and "S2", "S2_conf"),
+        and "kept", the number of base samples used.
+    """
+    D = problem["num_vars"]
+    Y = finite_points(problem, Y, calc_second_order, warn)
+    N = Y.size // (2 * D + 2 if calc_second_order else D + 2)
+    Y = (Y - Y.mean()) / Y.std()
+    A, B, AB, BA = sobol.separate_output_values(Y, D, N, calc_second_order)
 
-    for i in range(numSamples):
-        input_values = problem_set["input"][i]
-        for j, param_name in enumerate(problem_set["names"]):
-            fm[param_name] = input_values[j]
+    rng = np.random.default_rng(seed).integers if seed else np.random.randint
+    r = rng(N, size=(N, num_resamples))
+    Z = norm.ppf(0.5 + conf_level / 2)
 
-        result = model_parameters(ROS_models[model_key]["get_values"](fm))
-        diff += abs(result[problem_set["result_var"]] - problem_set[lookat][i])
+    with get_executor(executor) as pool, ExitStack() as blocks:
+        points = Y.reshape(N, -1)
+        if isinstance(pool, ProcessPoolExecutor):
+            points = blocks.enter_context(SharedArray.from_array(points))
+        estimates = np.concatenate(
+            map_chunks(_bootstrap_estimates, r.T, (points, D), pool, chunk_size)
+        )
+    conf = Z * estimates.std(axis=0, ddof=1)
+    if np.ptp(np.r_[A[r], B[r]]) == 0.0:
+        conf[: 2 * D] = 0.0
+
+    S = sobol.create_Si_dict(D, num_resamples, False, calc_second_order)
+    for j in range(D):
+        S["S1"][j] = sobol.first_order(A, AB[:, j], B)
+        S["ST"][j] = sobol.total_order(A, AB[:, j], B)
+    S["S1_conf"][:] = conf[:D]
+    S["ST_conf"][:] = conf[D : 2 * D]
+    if calc_second_order:
+        pairs = [(j, k) for j in range(D) for k in range(j + 1, D)]
+        for (j, k), S2_conf in zip(pairs, conf[2 * D :]):
+            S["S2"][j, k] = sobol.second_order(A, AB[:, j], AB[:, k], BA[:, j], B)
+            S["S2_conf"][j, k] = S2_conf
 
-    return diff / numSamples
+    S["kept"] = N
+    S.problem = problem
+    S.to_df = MethodType(sobol.to_df, S)
+    return S
 
 
-def sobol_analysis(problem_set, lookat="results"):
+def sobol_analysis(
+    problem_set,
+    lookat="results",
+    outputs=None,
+    num_resamples=100,
+    conf_level=0.95,
+    seed=None,
+    executor=None,
+):
     """
     Perform Sobol sensitivity analysis on the problem set.
 
+    Base samples with a non finite value are left out with a warning, see
+    finite_points, the indices holding the number of base samples used as
+    "kept".
+
     Parameters:
         problem_set (dict): The problem set containing inputs and results.
         lookat (str): The key to look at in the problem set.
+        outputs (list or str): Names of outputs of the problem set (see
+            output_column), or "all" for every output, to analyze instead of
+            lookat, from the same samples.
+        num_resamples (int): Number of bootstrap resamples.
+        conf_level (float): Confidence level of the intervals.
+        seed (int): Seed of the bootstrap.
+        executor (str or Executor): "serial", "thread" or "process"
+            evaluation of the bootstrap resamples by blocks, see
+            sobol_indices, instead of the serial SALib bootstrap.
 
     Returns:
         tuple: Sobol indices, parameter names, y positions, and model name.
+        With outputs, the Sobol indices are a dict {output name: indices}.
     """
-    Si = sobol.analyze(problem_set, problem_set[lookat])
+    if outputs is None:
+        values = {None: problem_set[lookat]}
+    else:
+        if outputs == "all":
+            outputs = problem_set["output_names"]
+        values = {name: output_column(problem_set, name) for name in outputs}
+
+    kwargs = dict(num_resamples=num_resamples, conf_level=conf_level, seed=seed)
+    Si = {}
+    with get_executor(executor) as pool:
+        for name, Y in values.items():
+            if executor is None:
+                Y = finite_points(problem_set, Y)
+                Si[name] = sobol.analyze(problem_set, Y, **kwargs)
+                Si[name]["kept"] = Y.size // (2 * problem_set["num_vars"] + 2)
+            else:
+                Si[name] = sobol_indices(problem_set, Y, executor=pool, **kwargs)
+    if outputs is None:
+        Si = Si[None]
     params = problem_set["names"]
     model_name = problem_set["model_name"]
     y_pos = np.arange(len(params))
     return Si, params, y_pos, model_name
 
 
+def adaptive_sobol_analysis(
+    model_key,
+    kind_of_parameter=["environment", "typical", "fuelstate", "model"],
+    result_var="ROS",
+    selected_params=None,
+    tolerance=0.05,
+    N_start=2**8,
+    N_max=2**16,
+    seed=None,
+    num_resamples=100,
+    conf_level=0.95,
+    executor=None,
+    chunk_size=4096,
+):
+    """
+    Sobol sensitivity analysis with a sample size grown until convergence.
+
+    Starting from N_start base samples, N is doubled, keeping the balance
+    properties of the Sobol sequence, until the largest bootstrap confidence
+    interval (half-width at conf_level) of S1 and ST is below tolerance or N
+    reaches N_max. Each step only draws and evaluates the new base samples of
+    the sequence, the samples of the previous steps are kept.
+
+    Parameters:
+        model_key (str): Key identifying the ROS model.
+        kind_of_parameter (list): List of parameter categories to include.
+        result_var (str): The result variable to analyze.
+        selected_params (list): selection of parameters to use.
+        tolerance (float): Target half-width of the S1 and ST confidence intervals.
+        N_start (int): First number of base samples, a power of 2.
+        N_max (int): Largest number of base samples.
+        seed (int): Seed of the scrambled Sobol sequence and of the bootstrap.
+        num_resamples (int): Number of bootstrap resamples.
+        conf_level (float): Confidence level of the intervals.
+        executor (str or Executor): "serial", "thread" or "process" evaluation
+            of the samples, see parallel.map_chunks.
+        chunk_size (int): Number of samples per evaluation chunk.
+
+    Returns:
+        tuple: Sobol indices and the problem set, holding the inputs and
+        outputs as generate_problem_set does, and "N", "evaluations" (number
+        of model evaluations), "kept" (base samples with finite results, the
+        only ones used, see finite_points), "max_conf" and "converged".
+    """
+    problem = _build_problem(model_key, kind_of_parameter, selected_params)
+    D = problem["num_vars"]
+    engine = qmc.Sobol(d=2 * D, scramble=True, seed=seed)
+    base = default_parameters(model_key)
+
+    problem["result_var"] = result_var
+    problem["output_names"] = output_names(model_key)
+    inputs, outputs = [], []
+    N, N_next = 0, N_start
+    with get_executor(executor) as pool:
+        while True:
+            rows = scale_samples(saltelli_rows(engine.random(N_next - N)), problem)
+            inputs.append(rows)
+            outputs.append(np.empty((len(rows), len(problem["output_names"]))))
+            evaluate_samples(
+                model_key,
+                base,
+                problem["names"],
+                rows,
+                executor=pool,
+                chunk_size=chunk_size,
+                out=outputs[-1],
+            )
+            problem["outputs"] = np.concatenate(outputs)
+            problem["results"] = output_column(problem, result_var)
+            N = N_next
+
+            Si = sobol_indices(
+                problem,
+                problem["results"],
+                num_resamples=num_resamples,
+                conf_level=conf_level,
+                seed=seed,
+                executor=pool,
+                warn=False,
+            )
+            max_conf = max(np.nanmax(Si["S1_conf"]), np.nanmax(Si["ST_conf"]))
+            if max_conf <= tolerance or N >= N_max:
+                break
+            N_next = min(2 * N, N_max)
+
+    problem["input"] = np.concatenate(inputs)
+    problem["N"] = N
+    problem["evaluations"] = len(problem["results"])
+    problem["kept"] = Si["kept"]
+    warn_dropped(Si["kept"], N)
+    problem["max_conf"] = max_conf
+    problem["converged"] = bool(max_conf <= tolerance)
+    return Si, problem
+
+
+def catalog_fuels(model_key, csv_table=fdb.CB2005_t7_csv):
+    """
+    Fuels of a fuels_database table, completed by the model default values
+    for the parameters the table does not give.
+    """
+    defaults = default_parameters(model_key)
+    return [
+        model_parameters.compose(fuel, defaults, warn=False)
+        for fuel in fdb.load_csv(csv_table)
+    ]
+
+
+def _catalog_rows(model_key, fuels, names, result_var, rows):
+    """
+    result_var of every fuel for rows of sampled values, (len(rows), n_fuels),
+    nan where the model solver did not converge as in runROS.evaluate_samples.
+    """
+    environments = {name: rows[:, j] for j, name in enumerate(names)}
+    catalog = run_fuel_catalog(model_key, fuels, environments, chunk_size=len(rows))
+    values = np.where(catalog["nonConverged"], np.nan, catalog["results"][result_var])
+    return values.T
+
+
+def catalog_sobol_analysis(
+    model_key,
+    fuels=None,
+    kind_of_parameter=["environment", "fuelstate"],
+    result_var="ROS",
+    selected_params=None,
+    N=1024,
+    seed=None,
+    num_resamples=100,
+    conf_level=0.95,
+    executor=None,
+    chunk_size=4096,
+):
+    """
+    Sobol sensitivity analysis of every fuel of a catalog.
+
+    One Sobol sample matrix of the kind_of_parameter parameters is drawn and
+    shared by all the fuels: its rows are evaluated against every fuel at
+    once (see runROS.run_fuel_catalog), by chunks of chunk_size rows in
+    executor, and the indices of each fuel are computed with the same
+    bootstrap resamples (see sobol_indices). Unless selected, the parameters
+    whose values differ between the fuels are left out. Sampled parameters
+    that are read when preparing the fuels (e.g. H_BTUlb) override the values
+    of every fuel, run_fuel_catalog then preparing the fuels again for each
+    chunk. For each fuel, base samples with a non finite result, in
+    particular where the model solver did not converge, are left out with all
+    their Saltelli rows (see finite_points), with a single warning for the
+    catalog, and a fuel with a constant result gets nan indices.
+
+    Parameters:
+        model_key (str): Key identifying the ROS model.
+        fuels (list): Fuel parameter sets, the CB2005_t7_csv fuels if None.
+        kind_of_parameter (list): List of parameter categories to sample.
+        result_var (str): The result variable to analyze.
+        selected_params (list): selection of parameters to use.
+        N (int): Number of base samples.
+        seed (int): Seed of the scrambled Sobol sequence and of the bootstrap.
+        num_resamples (int): Number of bootstrap resamples.
+        conf_level (float): Confidence level of the intervals.
+        executor (str or Executor): "serial", "thread" or "process"
+            evaluation of the samples and bootstrap resamples.
+        chunk_size (int): Number of samples per evaluation chunk.
+
+    Returns:
+        dict: "Model", "FUELCODE", "names" and "bounds" of the sampled
+        parameters, "dims" and
+        "S1", "S1_conf", "ST", "ST_conf" tables of (n_fuels, n_parameters)
+        indices, "N", "evaluations" and "kept" (base samples used per fuel).
+    """
+    fuels = catalog_fuels(model_key) if fuels is None else list(fuels)
+    problem = _build_problem(model_key, kind_of_parameter, selected_params)
+    if selected_params is None:
+        columns = stack_fuels(fuels)
+        selected_params = [
+            name
+            for name in problem["names"]
+            if np.ptp(np.asarray(columns[name], dtype=float)) == 0
+        ]
+        problem = _build_problem(model_key, kind_of_parameter, selected_params)
+    samples = sobolsample.sample(problem, N, seed=seed)
+    rows_per_point = 2 * problem["num_vars"] + 2
+    kept = np.zeros(len(fuels), dtype=int)
+
+    tables = {
+        key: np.full((len(fuels), problem["num_vars"]), np.nan)
+        for key in ["S1", "S1_conf", "ST", "ST_conf"]
+    }
+    with get_executor(executor) as pool:
+        values = np.empty((len(samples), len(fuels)))
+        map_chunks(
+            _catalog_rows,
+            samples,
+            (model_key, fuels, problem["names"], result_var),
+            pool,
+            chunk_size,
+            out=values,
+        )
+        for f in range(len(fuels)):
+            Y = finite_points(problem, values[:, f], warn=False)
+            kept[f] = len(Y) // rows_per_point
+            if kept[f] < 2 or np.ptp(Y) == 0:
+                continue
+            Si = sobol_indices(
+                problem,
+                Y,
+                num_resamples=num_resamples,
+                conf_level=conf_level,
+                seed=seed,
+                executor=pool,
+            )
+            for key in tables:
+                tables[key][f] = Si[key]
+    warn_dropped(int(kept.sum()), N * len(fuels), "base samples of the fuels")
+
+    return {
+        "Model": model_key,
+        "FUELCODE": [fuel.SI_params.get("CODE") for fuel in fuels],
+        "names": problem["names"],
+        "bounds": problem["bounds"],
+        "dims": ["fuel", "parameter"],
+        **tables,
+        "N": N,
+        "evaluations": values.size,
+        "kept": kept,
+    }
+
+
+def morris_screening(
+    model_key,
+    kind_of_parameter=["environment", "typical", "fuelstate", "model"],
+    result_var="ROS",
+    selected_params=None,
+    num_trajectories=200,
+    num_levels=4,
+    seed=None,
+    num_resamples=100,
+    conf_level=0.95,
+    executor=None,
+    chunk_size=4096,
+):
+    """
+    Morris elementary effects screening of the model parameters.
+
+    Costs num_trajectories * (D + 1) model evaluations for D parameters,
+    against N * (2D + 2) for a Sobol analysis, and ranks the parameters by
+    mu_star, the mean absolute elementary effect. Trajectories with a non
+    finite result are left out with a warning, see warn_dropped. See
+    influential_parameters to select the parameters of a Sobol analysis.
+
+    Parameters:
+        model_key (str): Key identifying the ROS model.
+        kind_of_parameter (list): List of parameter categories to include.
+        result_var (str): The result variable to analyze.
+        selected_params (list): selection of parameters to use.
+        num_trajectories (int): Number of Morris trajectories.
+        num_levels (int): Number of grid levels of each parameter.
+        seed (int): Seed of the trajectories and of the bootstrap.
+        num_resamples (int): Number of bootstrap resamples of mu_star_conf.
+        conf_level (float): Confidence level of mu_star_conf.
+        executor (str or Executor): "serial", "thread" or "process" evaluation
+            of the samples, see parallel.map_chunks.
+        chunk_size (int): Number of samples per evaluation chunk.
+
+    Returns:
+        tuple: Morris indices ("mu", "mu_star", "sigma", "mu_star_conf" per
+        parameter) and the problem set holding the inputs and results, and
+        "kept", the number of trajectories used.
+    """
+    problem = _build_problem(model_key, kind_of_parameter, selected_params)
+    param_values = morrissample.sample(
+        problem, num_trajectories, num_levels=num_levels, seed=seed
+    )
+    outputs = evaluate_samples(
+        model_key,
+        default_parameters(model_key),
+        problem["names"],
+        param_values,
+        executor=executor,
+        chunk_size=chunk_size,
+    )
+    results = np.asarray(outputs[result_var], dtype=float)
+
+    # Trajectories with a failed evaluation would spoil the mean effects
+    trajectory_size = problem["num_vars"] + 1
+    finite = np.isfinite(results.reshape(-1, trajectory_size)).all(axis=1)
+    warn_dropped(int(finite.sum()), len(finite), "trajectories")
+    kept = np.repeat(finite, trajectory_size)
+    Si = morris.analyze(
+        problem,
+        param_values[kept],
+        results[kept],
+        num_resamples=num_resamples,
+        conf_level=conf_level,
+        num_levels=num_levels,
+        seed=seed,
+    )
+
+    problem["input"] = param_values
+    problem["result_var"] = result_var
+    problem["results"] = results
+    problem["kept"] = int(finite.sum())
+    return Si, problem
+
+
+def influential_parameters(Si, threshold=0.05, max_params=None):
+    """
+    Names of the influential parameters of a Morris screening, by decreasing
+    mu_star, to be passed as selected_params to the Sobol analysis.
+
+    Parameters:
+        Si (dict): Morris indices, see morris_screening.
+        threshold (float): Smallest mu_star kept, relative to the largest one.
+        max_params (int): Largest number of parameters kept.
+
+    Returns:
+        list: Parameter names.
+    """
+    mu_star = np.asarray(Si["mu_star"], dtype=float)
+    order = np.argsort(-mu_star, kind="stable")
+    kept = [
+        str(Si["names"][index])
+        for index in order
+        if mu_star[index] >= threshold * np.nanmax(mu_star)
+    ]
+    return kept[:max_params]
+
+
 def plot_sobol_indices(Si, params, y_pos, model_name):
     """
     Plot the Sobol sensitivity indices.
@@ -235,8 +1051,38 @@ def main():
     parser.add_argument(
         "--plot", action="store_true", help="Whether to plot the Sobol indices"
     )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=None,
+        help="Grow N from --N until the S1/ST confidence intervals are below this",
+    )
+
+    parser.add_argument(
+        "--screen",
+        type=float,
+        default=None,
+        help="Morris screening of all parameters, keeping those whose mu_star "
+        "is above this fraction of the largest",
+    )
+
+    parser.add_argument(
+        "--catalog",
+        action="store_true",
+        help="Print the total-effect indices of every CB2005 fuel and exit",
+    )
 
     args = parser.parse_args()
+    if args.catalog:
+        # One shared sample matrix for all the fuels of the catalog
+        catalog = catalog_sobol_analysis(
+            args.model, result_var=args.result_var, N=args.N
+        )
+        print("FUEL " + " ".join(f"{name:>12}" for name in catalog["names"]))
+        for code, ST in zip(catalog["FUELCODE"], catalog["ST"]):
+            print(f"{code:<4} " + " ".join(f"{value:12.3f}" for value in ST))
+        return
+
     selected_params = [
         "fl1h_tac",
         "fd_ft",
@@ -246,17 +1092,36 @@ def main():
         "wind",
         "slope_tan",
     ]
-    # Generate problem set
-    problem_set = generate_problem_set(
-        model_key=args.model,
-        result_var=args.result_var,
-        N=args.N,
-        val_prop=args.val_prop,
-        selected_params=selected_params,
-    )
+    if args.screen is not None:
+        # Keep the parameters found influential by a Morris screening
+        Si_morris, _ = morris_screening(args.model, result_var=args.result_var)
+        selected_params = influential_parameters(Si_morris, threshold=args.screen)
+        print(f"Influential parameters: {selected_params}")
+    if args.tolerance is not None:
+        # Grow the problem set until the indices converge
+        Si_ros, problem_set = adaptive_sobol_analysis(
+            args.model,
+            result_var=args.result_var,
+            selected_params=selected_params,
+            tolerance=args.tolerance,
+            N_start=args.N,
+        )
+        print(f"N = {problem_set['N']}, {problem_set['evaluations']} model evaluations")
+        params = problem_set["names"]
+        y_pos = np.arange(len(params))
+        model_name = args.model
+    else:
+        # Generate problem set
+        problem_set = generate_problem_set(
+            model_key=args.model,
+            result_var=args.result_var,
+            N=args.N,
+            val_prop=args.val_prop,
+            selected_params=selected_params,
+        )
 
-    # Perform Sobol analysis
-    Si_ros, params, y_pos, model_name = sobol_analysis(problem_set)
+        # Perform Sobol analysis
+        Si_ros, params, y_pos, model_name = sobol_analysis(problem_set)
 
     # Optionally plot the results
     if args.plot:
@@ -264,8 +1129,9 @@ def main():
     plot_sobol_indices(Si_ros, params, y_pos, model_name)
 
     # Optionally verify error
-    error = verify_error(problem_set)
-    print(f"Average Absolute Error: {error}")
+    metrics = error_metrics(problem_set)
+    print(f"Average Absolute Error: {metrics['MAE']}")
+    print(f"RMS Error: {metrics['RMSE']}, Max Error: {metrics['max']}")
 
 
 if __name__ == "__main__":